@@ -0,0 +1,56 @@
+# Compares two benchmark reports from benchmarks.run
+#
+#   python -m benchmarks.compare base.json new.json
+#
+# Negative change is better for latency, CPU, startup and memory; positive is better for throughput
+import argparse
+import json
+
+
+def change(old, new) -> str:
+    if not old or new is None:
+        return "n/a"
+    return f"{100.0 * (new - old) / old:+.1f}%"
+
+
+def row(label: str, old, new) -> str:
+    return f"{label:<36} {old if old is not None else '-':>12} {new if new is not None else '-':>12} {change(old, new):>9}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    args = parser.parse_args(argv)
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"base: {base.get('commit')}  new: {new.get('commit')}")
+    if base.get("params") != new.get("params"):
+        print("warning: the reports were run with different parameters")
+    print(f"{'':<36} {'base':>12} {'new':>12} {'change':>9}")
+    print(row("startup_seconds", base.get("startup_seconds"), new.get("startup_seconds")))
+    for key in ("after_start", "end"):
+        print(row(f"rss_mb.{key}", base.get("rss_mb", {}).get(key), new.get("rss_mb", {}).get(key)))
+    for name, old in base.get("scenarios", {}).items():
+        current = new.get("scenarios", {}).get(name)
+        if current is None:
+            continue
+        print(row(f"{name}.throughput_rps", old["throughput_rps"], current["throughput_rps"]))
+        for q in ("p50", "p99"):
+            print(row(f"{name}.{q}_ms", old["latency_ms"][q], current["latency_ms"][q]))
+        print(row(f"{name}.cpu_ms_per_request", old.get("cpu_ms_per_request"), current.get("cpu_ms_per_request")))
+        if old["errors"] or current["errors"]:
+            print(row(f"{name}.errors", old["errors"], current["errors"]))
+        for group, old_group in old.get("groups", {}).items():
+            current_group = current.get("groups", {}).get(group)
+            if current_group is None:
+                continue
+            for q in ("p50", "p99"):
+                print(row(f"{name}.{group}.{q}_ms", old_group["latency_ms"][q], current_group["latency_ms"][q]))
+
+
+if __name__ == "__main__":
+    main()
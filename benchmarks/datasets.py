@@ -0,0 +1,97 @@
+# Synthetic data files for the benchmarks, in the same format as data/users.json and data/requirement.json
+import json
+import os
+import random
+from passlib.hash import bcrypt
+from services.compact_rows import PackedRows
+from services.persistence import atomic_write
+from services.snapshots import encode_binary
+
+LOCATIONS = [
+    "Bandung", "Jakarta", "Surabaya", "Medan", "Semarang", "Makassar", "Palembang", "Denpasar",
+    "Yogyakarta", "Malang", "Bogor", "Depok", "Tangerang", "Bekasi", "Padang", "Manado",
+]
+TYPES = ["Rumah", "Apartemen", "Ruko", "Tanah"]
+STATUSES = ["Dijual", "Terjual", "Disewakan"]
+
+# Every benchmark user logs in with this password
+PASSWORD = "bench-password"
+
+
+def username(i: int) -> str:
+    return f"bench{i}"
+
+
+def real_estate_row(rng: random.Random, row_id: int) -> dict:
+    location = rng.choice(LOCATIONS)
+    return {
+        "id": row_id,
+        "name": f"listing{row_id}",
+        "address": f"Jl. Benchmark No. {row_id}, {location}",
+        "location": location,
+        "price": rng.randrange(10000, 5000000, 1000),
+        "area": rng.randrange(30, 1000),
+        "bedroom": rng.randrange(1, 7),
+        "bathroom": rng.randrange(1, 5),
+        "description": "Dekat dengan sekolah, rumah sakit, dan tempat ibadah",
+        "image": f"https://example.com/listing/{row_id}.jpg",
+        "type": rng.choice(TYPES),
+        "status": rng.choice(STATUSES),
+        "multiplier": round(rng.uniform(0.5, 3.0), 2),
+    }
+
+
+def write_users(path: str, count: int, rounds: int):
+    # One hash shared by everyone: hashing 100k passwords would take longer than the benchmark
+    password_hash = bcrypt.using(rounds=rounds).hash(PASSWORD)
+    with open(path, "w") as f:
+        json.dump([
+            {"id": i, "username": username(i), "password_hash": password_hash, "is_admin": True, "token_teman": ""}
+            for i in range(1, count + 1)
+        ], f)
+
+
+def demographic_rows(rng: random.Random) -> list:
+    return [
+        {"population": rng.randrange(100000, 10000000), "populationDensity": rng.randrange(100, 20000), "location": location}
+        for location in LOCATIONS
+    ]
+
+
+def write_requirements(path: str, listings: int, seed: int):
+    rng = random.Random(seed)
+    demographic = demographic_rows(rng)
+    # Streamed row by row so a million listings don't need a second copy in memory
+    with open(path, "w") as f:
+        f.write('{"realEstate": [')
+        for row_id in range(1, listings + 1):
+            if row_id > 1:
+                f.write(", ")
+            f.write(json.dumps(real_estate_row(rng, row_id)))
+        f.write('], "demographicData": ')
+        f.write(json.dumps(demographic))
+        f.write("}")
+
+
+# The same rows as write_requirements, as a binary snapshot (SNAPSHOT_FORMAT=binary)
+def write_binary_snapshot(path: str, listings: int, seed: int):
+    rng = random.Random(seed)
+    demographic = demographic_rows(rng)
+    first = real_estate_row(rng, 1)
+    rows = [tuple(first.values())]
+    rows += [tuple(real_estate_row(rng, row_id).values()) for row_id in range(2, listings + 1)]
+    atomic_write(path, encode_binary({
+        "realEstate": PackedRows(tuple(first), rows),
+        "demographicData": PackedRows(None, demographic),
+    }))
+
+
+# Creates <workdir>/data with users and listings
+def build(workdir: str, users: int, listings: int, bcrypt_rounds: int, seed: int, snapshot_format: str = "json"):
+    data_dir = os.path.join(workdir, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    write_users(os.path.join(data_dir, "users.json"), users, bcrypt_rounds)
+    write_requirements(os.path.join(data_dir, "requirement.json"), listings, seed)
+    if snapshot_format == "binary":
+        # Written last, so it is the newer snapshot and the one the app loads
+        write_binary_snapshot(os.path.join(data_dir, "requirement.snapshot"), listings, seed)
@@ -0,0 +1,357 @@
+# Load test for the API against tools/friend_stub.py with synthetic data
+#
+# Jalankan dari root repo:
+#   python -m benchmarks.run --users 1000 --listings 100000 --duration 10 --output report.json
+#
+# The app and the stub run as separate uvicorn processes in a temporary directory, so the
+# real data/ folder is never touched. The report is JSON; compare two with benchmarks.compare
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List
+import httpx
+from benchmarks import datasets
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: int):
+    # Linux only; None elsewhere
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def cpu_seconds(pid: int):
+    # Linux only; user + system time of the process and its children (the uvicorn workers), None elsewhere
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the command name, which is in parentheses and may contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        total = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except (OSError, ValueError):
+        return None
+    for child in children:
+        total += cpu_seconds(child) or 0.0
+    return total
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def start_server(module: str, port: int, cwd: str, env: dict, log_name: str, workers: int = 1) -> subprocess.Popen:
+    with open(os.path.join(cwd, log_name), "w") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning", "--workers", str(workers)],
+            cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} while starting ({url})")
+        try:
+            httpx.get(url, timeout=1.0)
+            return time.perf_counter() - start
+        except httpx.TransportError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server did not start within {timeout}s ({url})")
+
+
+def stop_server(process: subprocess.Popen):
+    # SIGINT lets uvicorn run the lifespan shutdown (flushes the write-behind files)
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+#-----------------------------Scenarios-----------------------------------#
+# Each scenario returns the coroutine one virtual user runs per iteration: (client, rng) -> response
+class Bench:
+    def __init__(self, args, tokens: List[str]):
+        self.args = args
+        self.tokens = tokens
+
+    def auth(self, rng: random.Random) -> dict:
+        return {"Authorization": f"Bearer {rng.choice(self.tokens)}"}
+
+    async def login(self, client: httpx.AsyncClient, rng: random.Random):
+        user = datasets.username(rng.randint(1, self.args.users))
+        return await client.post("/token", data={"username": user, "password": datasets.PASSWORD})
+
+    async def me(self, client: httpx.AsyncClient, rng: random.Random):
+        return await client.get("/users/me", headers=self.auth(rng))
+
+    async def read_by_id(self, client: httpx.AsyncClient, rng: random.Random):
+        return await client.get(f"/support/realEstate/{rng.randint(1, self.args.listings)}", headers=self.auth(rng))
+
+    async def read_list(self, client: httpx.AsyncClient, rng: random.Random):
+        params = {"location": rng.choice(datasets.LOCATIONS), "type": rng.choice(datasets.TYPES),
+                  "sort": "price", "limit": 50}
+        return await client.get("/support/realEstate", params=params, headers=self.auth(rng))
+
+    async def stats(self, client: httpx.AsyncClient, rng: random.Random):
+        return await client.get(f"/stats/locations/{rng.choice(datasets.LOCATIONS)}", headers=self.auth(rng))
+
+    # One create, update and delete per iteration, so the dataset size stays the same
+    async def write(self, client: httpx.AsyncClient, rng: random.Random):
+        headers = self.auth(rng)
+        row = datasets.real_estate_row(rng, 0)
+        response = await client.post("/support/realEstate", json=row, headers=headers)
+        if response.status_code != 200:
+            return response
+        row_id = response.json()["id"]
+        row["price"] += 1000
+        response = await client.put(f"/support/realEstate/{row_id}", json=row, headers=headers)
+        if response.status_code != 200:
+            return response
+        return await client.delete(f"/support/realEstate/{row_id}", headers=headers)
+
+    async def listrik(self, client: httpx.AsyncClient, rng: random.Random):
+        return await client.get("/friend/getListrikRealEstate", params={"limit": 100}, headers=self.auth(rng))
+
+
+# "mixed" is not a Bench step: login workers next to read workers, see run_mixed()
+SCENARIOS = ["login", "me", "read_by_id", "read_list", "stats", "write", "listrik", "mixed"]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+
+
+# Runs count workers that repeat step until the deadline, recording into recorder
+async def run_workers(client: httpx.AsyncClient, step: Callable[..., Awaitable[httpx.Response]], count: int,
+                      deadline: float, seed: int, recorder: Recorder, first_id: int = 0):
+    async def worker(worker_id: int):
+        rng = random.Random(seed * 100003 + worker_id)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await step(client, rng)
+                key = str(response.status_code)
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+            recorder.latencies.append(time.perf_counter() - start)
+            recorder.statuses[key] = recorder.statuses.get(key, 0) + 1
+
+    await asyncio.gather(*(worker(first_id + i) for i in range(count)))
+
+
+async def run_scenario(base_url: str, step: Callable[..., Awaitable[httpx.Response]], concurrency: int,
+                       duration: float, seed: int) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        start = time.perf_counter()
+        await run_workers(client, step, concurrency, start + duration, seed, recorder)
+        elapsed = time.perf_counter() - start
+    return summarize(recorder, elapsed)
+
+
+# Logins and reads at the same time; the top-level numbers are the reads, since the point is
+# how much a login storm slows them down, and each group is reported on its own under "groups"
+async def run_mixed(base_url: str, bench: "Bench", logins: int, readers: int, duration: float, seed: int) -> dict:
+    groups = {"login": Recorder(), "read_by_id": Recorder(), "read_list": Recorder()}
+    total = logins + readers
+    limits = httpx.Limits(max_connections=total, max_keepalive_connections=total)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        by_id = (readers + 1) // 2
+        await asyncio.gather(
+            run_workers(client, bench.login, logins, deadline, seed, groups["login"]),
+            run_workers(client, bench.read_by_id, by_id, deadline, seed, groups["read_by_id"], logins),
+            run_workers(client, bench.read_list, readers - by_id, deadline, seed, groups["read_list"], logins + by_id),
+        )
+        elapsed = time.perf_counter() - start
+
+    reads = Recorder()
+    for name in ("read_by_id", "read_list"):
+        reads.latencies += groups[name].latencies
+        for key, count in groups[name].statuses.items():
+            reads.statuses[key] = reads.statuses.get(key, 0) + count
+    result = summarize(reads, elapsed)
+    result["groups"] = {name: summarize(recorder, elapsed) for name, recorder in groups.items()}
+    return result
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    latencies, statuses = sorted(recorder.latencies), recorder.statuses
+    ok = sum(count for key, count in statuses.items() if key.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "errors": len(latencies) - ok,
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(1000 * sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(1000 * percentile(latencies, 0.50), 3),
+            "p90": round(1000 * percentile(latencies, 0.90), 3),
+            "p99": round(1000 * percentile(latencies, 0.99), 3),
+            "max": round(1000 * latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+
+async def login_tokens(base_url: str, count: int, users: int) -> List[str]:
+    tokens = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0) as client:
+        for i in range(1, min(count, users) + 1):
+            response = await client.post("/token", data={"username": datasets.username(i), "password": datasets.PASSWORD})
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+    return tokens
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the API against the friend-service stub")
+    parser.add_argument("--users", type=int, default=1000, help="synthetic users in users.json")
+    parser.add_argument("--listings", type=int, default=10000, help="synthetic realEstate rows")
+    parser.add_argument("--listrik-rows", type=int, default=1000, help="rows served by the stub's /umum/data_listrik")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="cost of the synthetic password hash")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated, from: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual users per scenario")
+    parser.add_argument("--mixed-logins", type=int, default=8, help="login workers in the mixed scenario")
+    parser.add_argument("--mixed-readers", type=int, default=32, help="read workers in the mixed scenario")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--tokens", type=int, default=20, help="logged-in users shared by the authenticated scenarios")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="artificial friend-service latency (s)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (>1 uses STORAGE_MODE=shared)")
+    parser.add_argument("--table-storage", choices=("dict", "compact"), default="dict", help="TABLE_STORAGE for the app")
+    parser.add_argument("--snapshot-format", choices=("json", "binary"), default="json", help="SNAPSHOT_FORMAT for the app")
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="keep the app's per-client rate limits (off by default: every virtual user shares one address)")
+    parser.add_argument("--json-encoder", choices=("orjson", "json"), default="orjson", help="JSON_ENCODER for the app")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--keep", action="store_true", help="keep the temporary directory (data and server logs)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    build_start = time.perf_counter()
+    datasets.build(workdir, args.users, args.listings, args.bcrypt_rounds, args.seed, args.snapshot_format)
+    build_seconds = time.perf_counter() - build_start
+
+    stub_port, app_port = free_port(), free_port()
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    stub_env = dict(env, FRIEND_STUB_LATENCY=str(args.stub_latency), FRIEND_STUB_LISTRIK_ROWS=str(args.listrik_rows))
+    app_env = dict(env, FRIEND_BASE_URL=f"http://127.0.0.1:{stub_port}",
+                   TABLE_STORAGE=args.table_storage, SNAPSHOT_FORMAT=args.snapshot_format,
+                   JSON_ENCODER=args.json_encoder)
+    if args.workers > 1:
+        app_env["STORAGE_MODE"] = "shared"
+    if not args.rate_limits:
+        app_env.update(AUTH_RATE_LIMIT="0", LISTRIK_RATE_LIMIT="0")
+
+    stub = start_server("tools.friend_stub:app", stub_port, workdir, stub_env, "stub.log")
+    app_process = None
+    try:
+        wait_ready(f"http://127.0.0.1:{stub_port}/docs", stub, args.startup_timeout)
+        app_process = start_server("main:app", app_port, workdir, app_env, "app.log", args.workers)
+        base_url = f"http://127.0.0.1:{app_port}"
+        startup_seconds = wait_ready(f"{base_url}/metrics", app_process, args.startup_timeout)
+        # With --workers > 1 this is only the supervisor process
+        rss_after_start = rss_mb(app_process.pid)
+
+        bench = Bench(args, asyncio.run(login_tokens(base_url, args.tokens, args.users)))
+        results = {}
+        for name in scenarios:
+            print(f"running {name} ...", file=sys.stderr)
+            cpu_start = cpu_seconds(app_process.pid)
+            if name == "mixed":
+                run = run_mixed(base_url, bench, args.mixed_logins, args.mixed_readers, args.duration, args.seed)
+            else:
+                run = run_scenario(base_url, getattr(bench, name), args.concurrency, args.duration, args.seed)
+            results[name] = result = asyncio.run(run)
+            # App-side CPU only (the load generator and the stub are separate processes)
+            cpu_end = cpu_seconds(app_process.pid)
+            if cpu_start is not None and cpu_end is not None:
+                result["cpu_seconds"] = round(cpu_end - cpu_start, 3)
+                result["cpu_ms_per_request"] = round(1000 * (cpu_end - cpu_start) / max(1, result["requests"]), 4)
+        rss_end = rss_mb(app_process.pid)
+    finally:
+        if app_process is not None:
+            stop_server(app_process)
+        stop_server(stub)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "keep")},
+        "dataset_build_seconds": round(build_seconds, 3),
+        "startup_seconds": round(startup_seconds, 3),
+        "rss_mb": {"after_start": rss_after_start, "end": rss_end},
+        "scenarios": results,
+    }
+    if args.keep:
+        report["workdir"] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import os
+
+# Semua setelan bisa di-override lewat environment variable
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+# Pool untuk hashing/verifikasi password (bcrypt)
+# PASSWORD_POOL_KIND: "thread" atau "process"
+PASSWORD_POOL_KIND = os.getenv("PASSWORD_POOL_KIND", "thread")
+PASSWORD_POOL_WORKERS = _env_int("PASSWORD_POOL_WORKERS", min(4, os.cpu_count() or 1))
+# Jumlah maksimal permintaan yang boleh mengantri di luar worker yang sedang jalan
+PASSWORD_POOL_QUEUE = _env_int("PASSWORD_POOL_QUEUE", 64)
+
+# Cache untuk token JWT yang sudah diverifikasi (get_current_user)
+TOKEN_CACHE_SIZE = _env_int("TOKEN_CACHE_SIZE", 10000)
+TOKEN_CACHE_TTL = _env_int("TOKEN_CACHE_TTL", 300)
+
+# Write-behind persistence untuk file JSON di folder data/
+PERSIST_INTERVAL = float(os.getenv("PERSIST_INTERVAL", 1.0))
+# Flush lebih awal kalau jumlah perubahan yang belum disimpan mencapai batas ini
+PERSIST_MAX_DIRTY = _env_int("PERSIST_MAX_DIRTY", 100)
+
+# Journal (append-only) untuk data/requirement.json
+REQUIREMENT_JOURNAL = os.getenv("REQUIREMENT_JOURNAL", "data/requirement.journal")
+# Journal dilipat ke snapshot baru setelah sekian record
+JOURNAL_COMPACT_EVERY = _env_int("JOURNAL_COMPACT_EVERY", 10000)
+# Format snapshot: "json" (data/requirement.json) atau "binary" (data/requirement.snapshot, jauh lebih cepat di-load)
+SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "json")
+# Penyimpanan baris realEstate di memori: "dict" atau "compact" (tuple per baris, jauh lebih hemat RAM)
+TABLE_STORAGE = os.getenv("TABLE_STORAGE", "dict")
+# Encoder JSON untuk respons dan file data: "orjson" (kalau terpasang, jauh lebih cepat) atau "json"
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson")
+
+# Layanan teman (integration API)
+FRIEND_BASE_URL = os.getenv(
+    "FRIEND_BASE_URL", "https://integration-api-amjad.victoriousplant-40d1c733.australiaeast.azurecontainerapps.io"
+)
+FRIEND_MAX_CONNECTIONS = _env_int("FRIEND_MAX_CONNECTIONS", 100)
+FRIEND_MAX_KEEPALIVE = _env_int("FRIEND_MAX_KEEPALIVE", 20)
+FRIEND_KEEPALIVE_EXPIRY = float(os.getenv("FRIEND_KEEPALIVE_EXPIRY", 30.0))
+FRIEND_CONNECT_TIMEOUT = float(os.getenv("FRIEND_CONNECT_TIMEOUT", 5.0))
+FRIEND_TIMEOUT = float(os.getenv("FRIEND_TIMEOUT", 10.0))
+# Timeout per endpoint (detik), lebih pendek dari FRIEND_TIMEOUT
+FRIEND_TOKEN_TIMEOUT = float(os.getenv("FRIEND_TOKEN_TIMEOUT", 3.0))
+FRIEND_LISTRIK_TIMEOUT = float(os.getenv("FRIEND_LISTRIK_TIMEOUT", 5.0))
+# Retry untuk panggilan idempotent (GET/PUT/DELETE, /token/self) dengan backoff acak
+FRIEND_RETRIES = _env_int("FRIEND_RETRIES", 2)
+FRIEND_RETRY_BACKOFF = float(os.getenv("FRIEND_RETRY_BACKOFF", 0.1))
+FRIEND_RETRY_BACKOFF_MAX = float(os.getenv("FRIEND_RETRY_BACKOFF_MAX", 1.0))
+# Circuit breaker: terbuka setelah sekian kegagalan berturut-turut, dicoba lagi setelah RESET detik
+FRIEND_BREAKER_THRESHOLD = _env_int("FRIEND_BREAKER_THRESHOLD", 5)
+FRIEND_BREAKER_RESET = float(os.getenv("FRIEND_BREAKER_RESET", 10.0))
+# Login menunggu token teman paling lama sekian detik, sisanya diperbarui di background
+FRIEND_LOGIN_WAIT = float(os.getenv("FRIEND_LOGIN_WAIT", 0.5))
+# Token teman: umur default kalau token tidak punya klaim exp, dan diperbarui sekian detik sebelum habis
+FRIEND_TOKEN_TTL = float(os.getenv("FRIEND_TOKEN_TTL", 3600.0))
+FRIEND_TOKEN_REFRESH_MARGIN = float(os.getenv("FRIEND_TOKEN_REFRESH_MARGIN", 120.0))
+FRIEND_TOKEN_SCAN_INTERVAL = float(os.getenv("FRIEND_TOKEN_SCAN_INTERVAL", 30.0))
+# Password user disimpan di memori (tidak pernah ke disk) selama ini untuk memperbarui token teman;
+# 0 = tidak disimpan, token teman hanya diambil saat login (lihat README)
+FRIEND_CREDENTIALS_TTL = float(os.getenv("FRIEND_CREDENTIALS_TTL", 0.0))
+# Berapa lama data listrik dari layanan teman di-cache (detik)
+LISTRIK_CACHE_TTL = float(os.getenv("LISTRIK_CACHE_TTL", 30.0))
+
+# Admission control untuk route mahal (/token dan /register = "AUTH", /friend/getListrikRealEstate = "LISTRIK")
+# Rate limit token bucket per klien (AUTH, per alamat IP) atau per user (LISTRIK): request per detik
+# dan burst; 0 = tanpa batas. Lewat batas dijawab 429 dengan Retry-After
+AUTH_RATE_LIMIT = float(os.getenv("AUTH_RATE_LIMIT", 2.0))
+AUTH_RATE_BURST = _env_int("AUTH_RATE_BURST", 10)
+LISTRIK_RATE_LIMIT = float(os.getenv("LISTRIK_RATE_LIMIT", 2.0))
+LISTRIK_RATE_BURST = _env_int("LISTRIK_RATE_BURST", 10)
+# Request yang boleh jalan bersamaan per kelas route (0 = tanpa batas); sisanya antre paling banyak
+# QUEUE request dan paling lama QUEUE_WAIT detik, lalu dijawab 503 dengan Retry-After
+AUTH_CONCURRENCY = _env_int("AUTH_CONCURRENCY", 16)
+AUTH_QUEUE = _env_int("AUTH_QUEUE", 32)
+AUTH_QUEUE_WAIT = float(os.getenv("AUTH_QUEUE_WAIT", 2.0))
+LISTRIK_CONCURRENCY = _env_int("LISTRIK_CONCURRENCY", 8)
+LISTRIK_QUEUE = _env_int("LISTRIK_QUEUE", 16)
+LISTRIK_QUEUE_WAIT = float(os.getenv("LISTRIK_QUEUE_WAIT", 2.0))
+ADMISSION_RETRY_AFTER = _env_int("ADMISSION_RETRY_AFTER", 1)
+# Jumlah klien yang diingat rate limiter per kelas route (yang paling lama tidak aktif dilupakan)
+RATE_LIMIT_MAX_CLIENTS = _env_int("RATE_LIMIT_MAX_CLIENTS", 10000)
+# "1" kalau aplikasi di belakang reverse proxy: alamat klien diambil dari X-Forwarded-For
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0") == "1"
+
+# Cache byte respons (ETag) untuk endpoint baca
+RESPONSE_CACHE_SIZE = _env_int("RESPONSE_CACHE_SIZE", 256)
+# Respons lebih kecil dari ini (byte) tidak dikompres
+RESPONSE_COMPRESS_MIN = _env_int("RESPONSE_COMPRESS_MIN", 1024)
+
+# Mode penyimpanan: "local" (satu proses) atau "shared" (aman untuk uvicorn --workers N;
+# memakai file lock dan reload berdasarkan perubahan file, butuh fcntl/Linux)
+STORAGE_MODE = os.getenv("STORAGE_MODE", "local")
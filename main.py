@@ -1,10 +1,39 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from routes.requirements import getter_router, admin_router, friend_router, support_router
-from routes.auth import auth_router
+from routes.auth import auth_router, friend_tokens
+from routes.stats import stats_router
+from routes.metrics import metrics_router
 from jose import JWTError, jwt
 from fastapi.middleware.cors import CORSMiddleware
+from services.passwords import password_pool
+from services import persistence
+from services.friend_client import friend
+from services.metrics import MetricsMiddleware, loop_lag
+from services.json_codec import FastJSONResponse
 
-app = FastAPI()
+
+# Warnings from background work (persistence, token refresh) in the same format as uvicorn's own
+logging.basicConfig(level=logging.WARNING, format="%(levelname)s:     %(name)s: %(message)s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await persistence.start_all()
+    await friend_tokens.start()
+    await loop_lag.start()
+    yield
+    await loop_lag.stop()
+    # Stopped first so the tokens it stores are still flushed
+    await friend_tokens.stop()
+    await persistence.stop_all()
+    await friend.aclose()
+    password_pool.shutdown()
+
+
+# Responses are encoded with orjson when it is installed (services/json_codec.py)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 # Setelan CORS untuk menerima permintaan dari semua domain
 origins = ["*"]
 
@@ -16,9 +45,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Latency/status per route for /metrics
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(friend_router, prefix="/friend")
 app.include_router(support_router, prefix="/support")
 app.include_router(getter_router, prefix="/getters")
 app.include_router(admin_router, prefix="/admin")
+app.include_router(stats_router, prefix="/stats")
+app.include_router(metrics_router)
 app.include_router(auth_router)  # Include the authentication router
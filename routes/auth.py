@@ -1,29 +1,41 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.hash import bcrypt
 import jwt
-import json
 from models.users import Token, UserIn, UserJSON
+from services.admission import auth_admission
+from services.passwords import password_pool
+from services.user_store import UserStore
+from services.token_cache import TokenCache
+from services import persistence
+from services.friend_client import friend, friend_error
+from services.friend_tokens import FriendTokenManager
+from services.metrics import jwt_decode_seconds
+import config
 import httpx
 
 # Load user data from JSON file
-with open("data/users.json", "r") as json_file:
-    users_data = json.load(json_file)
+user_store = UserStore("data/users.json", shared=config.STORAGE_MODE == "shared")
+users_data = user_store.users
+persistence.register(user_store.file)
+
+# Verified tokens, dropped as soon as the user record changes
+token_cache = TokenCache(config.TOKEN_CACHE_SIZE, config.TOKEN_CACHE_TTL)
+user_store.subscribe(token_cache.invalidate_user)
+
+# token_teman per user, renewed in the background
+friend_tokens = FriendTokenManager(user_store)
 
 auth_router = APIRouter(tags=["Authentication"])
 JWT_SECRET = 'myjwtsecret'
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
 
 
-# Function to write user data to JSON file
-def write_users_to_json():
-    with open("data/users.json", "w") as json_file:
-        json.dump(users_data, json_file, indent=4)
-
 # Function to authenticate and get user
-def authenticate_user(username: str, password: str):
-    for user in users_data:
-        if user['username'] == username and bcrypt.verify(password, user['password_hash']):
+async def authenticate_user(username: str, password: str):
+    user_store.sync()
+    for user in user_store.get_by_username(username):
+        if await password_pool.verify(password, user['password_hash']):
             return user
     return None
 
@@ -32,9 +44,9 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token')
 
 
 # Route to generate token
-@auth_router.post('/token', response_model=Token)
+@auth_router.post('/token', response_model=Token, dependencies=[Depends(auth_admission.by_client)])
 async def generate_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
 
     if not user:
         raise HTTPException(
@@ -42,48 +54,42 @@ async def generate_token(form_data: OAuth2PasswordRequestForm = Depends()):
             detail='Invalid username or password'
         )
 
-    friend_service_url = "https://integration-api-amjad.victoriousplant-40d1c733.australiaeast.azurecontainerapps.io/token/self"
-
     token_data = {"sub": user['username'], "id": user['id']}
     token = jwt.encode(token_data, JWT_SECRET)
 
-    friend_token_data = {
-        "username": form_data.username,
-        "password": form_data.password
-    }
-
+    refresh = friend_tokens.login(user['id'], form_data.username, form_data.password)
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(friend_service_url, data=friend_token_data)
-        
-        response.raise_for_status()
-        friend_response_data = response.json()
-        friend_token = friend_response_data.get("access_token")
-        # menambahkan token ke user
-        for user in users_data:
-            if user['username'] == form_data.username :
-                user['token_teman'] = friend_token
-                write_users_to_json()
-
-    except httpx.HTTPError as e:
-        print(response.text)
-        raise HTTPException(status_code=500, detail=f"Failed to generate token in friend's service: {str(e)}")
-        
+        # shield: on timeout the refresh keeps running in the background
+        friend_token = await asyncio.wait_for(asyncio.shield(refresh), config.FRIEND_LOGIN_WAIT)
+    except (asyncio.TimeoutError, httpx.HTTPError, ValueError):
+        # Degraded login: the friend service is slow or down, so our own token is issued anyway
+        # with the last known token_teman; the user record gets the new one when the refresh finishes
+        friend_token = friend_tokens.peek(user['id'])
+
     return {'access_token': token, 'token_type': 'bearer', 'username' : form_data.username, 'token_teman': friend_token}
 
 # Dependency to get current user
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    # Picks up user changes from other workers first, which also invalidates their cached tokens
+    user_store.sync()
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        with jwt_decode_seconds.time():
+            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
         user_id = payload.get('id')
-        user = next((u for u in users_data if u['id'] == user_id), None)
+        user = user_store.get_by_id(user_id)
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, 
                 detail='Invalid user'
             )
-        return UserJSON(**user)  # Convert user dictionary to User Pydantic model
-    except jwt.JWTError:
+        current_user = UserJSON(**user)  # Convert user dictionary to User Pydantic model
+        token_cache.put(token, current_user, payload.get('exp'))
+        return current_user
+    except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail='Invalid token'
@@ -94,19 +100,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 async def get_user(user: UserJSON = Depends(get_current_user)):
     return user
 
+# Route to get token cache hit/miss counters
+@auth_router.get('/token/cache-stats')
+async def get_token_cache_stats(user: UserJSON = Depends(get_current_user)):
+    return token_cache.stats()
+
 # Route to register a new user
-@auth_router.post('/register', response_model=UserJSON)
+@auth_router.post('/register', response_model=UserJSON, dependencies=[Depends(auth_admission.by_client)])
 async def register_user(user: UserIn):
-    user_id = len(users_data) + 1
-    password_hash = bcrypt.hash(user.password)
-    
-    is_admin = True
-        
-    new_user = {"id": user_id, "username": user.username, "password_hash": password_hash, "is_admin": is_admin, "token_teman": ""}
-    users_data.append(new_user)
-    write_users_to_json()
+    password_hash = await password_pool.hash(user.password)
+
+    # Checked after hashing so no await sits between the check and the insert
+    with user_store.write_lock():
+        if user_store.get_by_username(user.username):
+            raise HTTPException(status_code=400, detail="Username already exists")
+
+        user_id = user_store.ids.allocate()
+
+        is_admin = True
 
-    friend_service_url = "https://integration-api-amjad.victoriousplant-40d1c733.australiaeast.azurecontainerapps.io/register"
+        new_user = {"id": user_id, "username": user.username, "password_hash": password_hash, "is_admin": is_admin, "token_teman": ""}
+        user_store.add(new_user)
 
     friend_token_data = {
         "username": user.username,
@@ -114,11 +128,14 @@ async def register_user(user: UserIn):
     }
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(friend_service_url, json=friend_token_data)
-        
+        response = await friend.post("/register", json=friend_token_data, operation="register")
         response.raise_for_status()
-    except httpx.HTTPError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate token in friend's service: {str(e)}")
+    except BaseException as e:
+        # Not registered upstream: take the local user back out so the client can simply retry
+        with user_store.write_lock():
+            user_store.remove(user_id)
+        if isinstance(e, httpx.HTTPError):
+            raise friend_error(e)
+        raise
     
     return new_user
\ No newline at end of file
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Response
+from routes.auth import friend_tokens, token_cache
+from routes.requirements import journal, listrik_cache
+from services.admission import route_classes
+from services.friend_client import friend
+from services.http_cache import response_cache
+from services.passwords import password_pool
+from services.metrics import registry
+
+metrics_router = APIRouter(tags=["Monitoring"])
+
+# Counters the caches and pools already keep, read only when /metrics is scraped
+registry.collected(
+    "cache_requests_total", "Cache lookups by cache and result", "counter", ("cache", "result"),
+    lambda: {
+        ("token", "hit"): token_cache.hits,
+        ("token", "miss"): token_cache.misses,
+        ("listrik", "hit"): listrik_cache.hits,
+        ("listrik", "miss"): listrik_cache.misses,
+        ("listrik", "coalesced"): listrik_cache.coalesced,
+        ("response", "hit"): response_cache.hits,
+        ("response", "miss"): response_cache.misses,
+        ("response", "not_modified"): response_cache.not_modified,
+    },
+)
+registry.collected(
+    "password_pool_pending", "bcrypt jobs running or queued", "gauge", (),
+    lambda: {(): password_pool.pending},
+)
+registry.collected(
+    "friend_circuit_open", "1 while a friend-service circuit breaker rejects calls", "gauge", ("operation",),
+    lambda: {(operation,): int(breaker.state != "closed") for operation, breaker in friend.breakers.items()},
+)
+registry.collected(
+    "friend_token_refreshes_total", "Friend token refreshes by result", "counter", ("result",),
+    lambda: {("ok",): friend_tokens.refreshes, ("failed",): friend_tokens.failures, ("retry_401",): friend_tokens.retried},
+)
+registry.collected(
+    "admission_in_flight", "Admitted requests running per route class", "gauge", ("route_class",),
+    lambda: {(route_class.name,): route_class.concurrency.in_flight for route_class in route_classes},
+)
+registry.collected(
+    "admission_waiting", "Requests waiting for a slot per route class", "gauge", ("route_class",),
+    lambda: {(route_class.name,): route_class.concurrency.waiting for route_class in route_classes},
+)
+registry.collected(
+    "admission_clients", "Clients tracked by the rate limiter per route class", "gauge", ("route_class",),
+    lambda: {(route_class.name,): len(route_class.rate_limiter) for route_class in route_classes},
+)
+registry.collected(
+    "journal_records_since_compaction", "Journal records not yet folded into the snapshot", "gauge", (),
+    lambda: {(): journal.records_since_compaction},
+)
+
+
+# Prometheus scrape endpoint
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,61 +1,103 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
-import json
+import asyncio
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from pydantic import ValidationError
+from typing import Any, List, Optional
 from models.requirements import RealEstate, DemographicData, DataListrik
 from models.users import UserJSON
-from routes.auth import get_current_user
+from routes.auth import friend_tokens, get_current_user
+from services import persistence
+from services.journal import Journal
+from services.table import Table
+from services.compact_rows import RowCodec
+from services.id_allocator import IdAllocator
+from services.friend_client import friend, friend_error
+from services.upstream_cache import CachedFetch
+from services.listing import ListQuery, page_rows, read_ndjson, render_list
+from services.admission import listrik_admission
+from services.http_cache import response_cache
+from services.json_codec import FastJSONResponse
+import config
 import httpx
 
 
-# Load data from the JSON file
-with open("data/requirement.json", "r") as json_file:
-    data = json.load(json_file)
+# Load data from the snapshot; the journal is replayed on top of it by journal.attach()
+journal = persistence.register(Journal(
+    "data/requirement.json", config.REQUIREMENT_JOURNAL, {"realEstate": "id", "demographicData": "location"},
+    shared=config.STORAGE_MODE == "shared", binary=config.SNAPSHOT_FORMAT == "binary",
+))
+data = journal.load()
 
 # Assign the tables
-demographicData = data.get("demographicData", [])
-realEstate = data.get("realEstate", [])
-
-getter_router = APIRouter(tags=["Getters Layanan Lama"])
-admin_router = APIRouter(tags=["CRUD Layanan Lama"])
-friend_router = APIRouter(tags=["Layanan Baru (Utama)"])
-support_router = APIRouter(tags=["Layanan Baru (Tambahan)"])
+demographicData = Table("demographicData", "location", data.get("demographicData", []), journal=journal)
+realEstate = Table("realEstate", "id", data.get("realEstate", []),
+                   indexes=("type", "status", "location", "bedroom"), sorted_indexes=("price", "area"),
+                   journal=journal,
+                   codec=RowCodec(RealEstate.model_fields) if config.TABLE_STORAGE == "compact" else None)
+realEstate.allocator = IdAllocator(realEstate.keys(), data.get("idAllocator", {}).get("realEstate", {}).get("highWater", 0))
+# The tables hold the rows now; drop the loaded copy (in compact mode it is a second full copy)
+del data
+journal.attach(realEstate, demographicData)
+journal.snapshot = lambda: {
+    "realEstate": realEstate,
+    "demographicData": demographicData,
+    "idAllocator": {"realEstate": realEstate.allocator.state()},
+}
+
+# Picks up writes from other workers before each request (no-op unless STORAGE_MODE=shared)
+async def sync_tables():
+    await journal.sync()
+
+getter_router = APIRouter(tags=["Getters Layanan Lama"], dependencies=[Depends(sync_tables)])
+admin_router = APIRouter(tags=["CRUD Layanan Lama"], dependencies=[Depends(sync_tables)])
+friend_router = APIRouter(tags=["Layanan Baru (Utama)"], dependencies=[Depends(sync_tables)])
+support_router = APIRouter(tags=["Layanan Baru (Tambahan)"], dependencies=[Depends(sync_tables)])
 
 #-----------------------------API Orang-----------------------------------#
+# Fetch data listrik from the friend service
+async def fetch_listrik_data() -> List[dict]:
+    response = await friend.get("/umum/data_listrik", operation="listrik", timeout=config.FRIEND_LISTRIK_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+# Authorization header for the friend service
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+# Shared cache of the upstream data listrik, invalidated by our own listrik writes
+listrik_cache = CachedFetch(fetch_listrik_data, config.LISTRIK_CACHE_TTL)
+# Data listrik posts await the friend service between their size check and the write itself,
+# so they go one at a time (otherwise two posts could both pass the check)
+listrik_posts = asyncio.Lock()
+
+# Admission for the listrik join, counted per user
+async def admit_listrik(user: UserJSON = Depends(get_current_user)):
+    async with listrik_admission.admit(f"user:{user.id}"):
+        yield
+
 #GET Data Listrik - Real Estate
-@friend_router.get("/getListrikRealEstate", response_model=List[dict])
-async def get_listrik_real_estate_data(user: UserJSON = Depends(get_current_user)) -> List[dict]:
+@friend_router.get("/getListrikRealEstate", response_model=List[dict], dependencies=[Depends(admit_listrik)])
+async def get_listrik_real_estate_data(query: ListQuery = Depends(), user: UserJSON = Depends(get_current_user)) -> List[dict]:
     try:
-        # Get real estate data
-        real_estate_data = realEstate
-
-        # Lakukan permintaan HTTP ke API eksternal untuk mendapatkan data listrik
-        async with httpx.AsyncClient() as client:
-            response = await client.get("https://integration-api-amjad.victoriousplant-40d1c733.australiaeast.azurecontainerapps.io/umum/data_listrik")
-        
-        # Periksa apakah permintaan berhasil (kode status 200)
-        response.raise_for_status()
-
-        # Ubah respons JSON menjadi bentuk yang sesuai dengan model Anda
-        listrik_data = response.json()
-
-        # Tambahkan realEstateID ke setiap data listrik based on id in realEstateData
-        for idx, data in enumerate(listrik_data):
-            # Check if the index is within the range of realEstateData
-            if idx < len(real_estate_data):
-                # Assign the realEstateID based on the id in realEstateData
-                data["realEstateID"] = real_estate_data[idx].get("id")
-            else:
-                # Handle the case where there are more entries in listrik_data than real_estate_data
-                # You may want to assign a default value or handle this case based on your requirements
-                data["realEstateID"] = None  # Set to a default value or handle as needed
-
-        # Join the real estate data with listrik data based on realEstateID and id
-        joined_data = []
-        for real_estate_entry in real_estate_data:
-            for listrik_entry in listrik_data:
-                if listrik_entry.get("realEstateID") == real_estate_entry.get("id"):
+        # Get real estate data: a snapshot, so writes during the await below don't show up halfway
+        real_estate_data = realEstate.snapshot()
+
+        # Ambil data listrik (dari cache kalau masih berlaku)
+        listrik_data = await listrik_cache.get()
+
+        # Build side of the hash join: realEstateID -> data listrik
+        # The realEstateID of each data listrik is the id of the real estate at the same index;
+        # entries beyond the real estate data have no realEstateID and never match
+        listrik_by_real_estate = {}
+        for real_estate_entry, listrik_entry in zip(real_estate_data, listrik_data):
+            listrik_by_real_estate.setdefault(real_estate_entry.get("id"), []).append(listrik_entry)
+
+        # Probe side: one pass over the real estate data, yielded lazily so a page stops early
+        # (and NDJSON streams it chunk by chunk); both sides are stable across awaits
+        def joined_data():
+            for real_estate_entry in real_estate_data:
+                for listrik_entry in listrik_by_real_estate.get(real_estate_entry.get("id"), ()):
                     # Combine the entries into a single dictionary with selected fields for listrikData
-                    joined_entry = {
+                    yield {
                         "realEstateID": real_estate_entry["id"],
                         "realEstateData": real_estate_entry,
                         "listrikData": {
@@ -64,13 +106,16 @@ async def get_listrik_real_estate_data(user: UserJSON = Depends(get_current_user
                             "jumlahListrik": listrik_entry["jumlahListrik"],
                         }
                     }
-                    joined_data.append(joined_entry)
 
-        return joined_data
+        return render_list(joined_data(), query, ("realEstateID", "realEstateData", "listrikData"))
+
+    except HTTPException:
+        # Already an answer for the client (e.g. 400 for unknown fields)
+        raise
 
     except httpx.HTTPError as e:
         # Tangani kesalahan HTTP jika terjadi
-        raise HTTPException(status_code=e.response.status_code, detail=str(e))
+        raise friend_error(e)
 
     except Exception as e:
         # Tangani kesalahan umum jika terjadi
@@ -84,38 +129,38 @@ async def addDataListrikRealEstate(change: DataListrik, user: UserJSON = Depends
     except Exception as e:
         raise HTTPException(status_code=422, detail="Invalid input data")
 
-    url = "https://integration-api-amjad.victoriousplant-40d1c733.australiaeast.azurecontainerapps.io/administrator/data_listik"
-    headers = {"Authorization": f"Bearer {user.token_teman}"}
+    url = "/administrator/data_listik"
 
     try:
-        # Get Data Real Estate
-        real_estate_data = await get_real_estate_data(user)
-
-        # Get Data Listrik
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://integration-api-amjad.victoriousplant-40d1c733.australiaeast.azurecontainerapps.io/umum/data_listrik"
-            )
-
-        response.raise_for_status()
-        listrik_data = response.json()
-
-        # Check if the length of dataListrik is not longer than dataRealEstate
-        if len(listrik_data) >= len(real_estate_data):
-            raise HTTPException(status_code=400, detail="Cannot add more dataListrik entries")
-
-        # Make the post request
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=change_dict, headers=headers)
+        async with listrik_posts:
+            # Get Data Listrik
+            listrik_data = await listrik_cache.get()
+
+            # Check if the length of dataListrik is not longer than dataRealEstate
+            if len(listrik_data) >= len(realEstate):
+                raise HTTPException(status_code=400, detail="Cannot add more dataListrik entries")
+
+            try:
+                # Make the post request with the user's token_teman (renewed and resent once on 401)
+                response = await friend_tokens.call(
+                    user.id, lambda token: friend.post(url, json=change_dict, headers=bearer(token), operation="listrik")
+                )
+            finally:
+                # Also on errors and cancellation: the friend service may have applied the write anyway
+                listrik_cache.invalidate()
 
         response.raise_for_status()
         updateDataListrik = response.json()
 
         return updateDataListrik
 
+    except HTTPException:
+        # The 400 for a full table, not a server error
+        raise
+
     except httpx.HTTPError as e:
         # Handle HTTP errors
-        raise HTTPException(status_code=e.response.status_code, detail=str(e))
+        raise friend_error(e)
 
     except Exception as e:
         # Handle other errors
@@ -130,18 +175,17 @@ async def updateDataListrikRealEstate(change: DataListrik, user: UserJSON = Depe
     except Exception as e:
         raise HTTPException(status_code=422, detail="Invalid input data")
 
-    # print(user.token_teman)
-    url = "https://integration-api-amjad.victoriousplant-40d1c733.australiaeast.azurecontainerapps.io/administrator/edit_listrik"
-
-    headers = {
-        "Authorization": f"Bearer {user.token_teman}"
-    }
+    url = "/administrator/edit_listrik"
 
     try:
-        # Make the PUT request
-        async with httpx.AsyncClient() as client:
-            response = await client.put(url, json=change_dict, headers=headers)
-        
+        try:
+            # Make the PUT request
+            response = await friend_tokens.call(
+                user.id, lambda token: friend.put(url, json=change_dict, headers=bearer(token), operation="listrik")
+            )
+        finally:
+            listrik_cache.invalidate()
+
         # Check if the request was successful (status code 2xx)
         response.raise_for_status()
 
@@ -152,10 +196,7 @@ async def updateDataListrikRealEstate(change: DataListrik, user: UserJSON = Depe
 
     except httpx.HTTPError as e:
         # Handle HTTP errors
-        if e.response.status_code == 404:
-            raise HTTPException(status_code=404, detail="API Update Data Listrik not found or error")
-        else:
-            raise HTTPException(status_code=e.response.status_code, detail=str(e))
+        raise friend_error(e, not_found="API Update Data Listrik not found or error")
 
     except Exception as e:
         # Handle other errors
@@ -165,15 +206,16 @@ async def updateDataListrikRealEstate(change: DataListrik, user: UserJSON = Depe
 @friend_router.delete("/delete/dataListrik-realEstate/{username}")
 async def deleteDataListrikRealEstate(username: str, user: UserJSON = Depends(get_current_user)):
     try:
-        # Get the authentication token from the user
-        auth_token = user.token_teman
-
-        # Make the DELETE request with the proper authorization header
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                f"https://integration-api-amjad.victoriousplant-40d1c733.australiaeast.azurecontainerapps.io/administratordelete_listrik/{username}",
-                headers={"Authorization": f"Bearer {auth_token}"}
+        try:
+            # Make the DELETE request with the user's token_teman as authorization header
+            response = await friend_tokens.call(
+                user.id, lambda token: friend.delete(
+                    f"/administratordelete_listrik/{username}", headers=bearer(token), operation="listrik",
+                    endpoint="/administratordelete_listrik/{username}",
+                )
             )
+        finally:
+            listrik_cache.invalidate()
 
         # Check if the request was successful (status code 2xx)
         response.raise_for_status()
@@ -185,10 +227,7 @@ async def deleteDataListrikRealEstate(username: str, user: UserJSON = Depends(ge
 
     except httpx.HTTPError as e:
         # Handle HTTP errors
-        if e.response.status_code == 404:
-            raise HTTPException(status_code=404, detail="User not found")
-        else:
-            raise HTTPException(status_code=e.response.status_code, detail=str(e))
+        raise friend_error(e, not_found="User not found")
 
     except Exception as e:
         # Handle other errors
@@ -196,27 +235,232 @@ async def deleteDataListrikRealEstate(username: str, user: UserJSON = Depends(ge
 
 
 #-----------------------------Getters-----------------------------------#
+# Filter and sort parameters for the real estate list (use with Depends())
+class RealEstateQuery:
+    def __init__(
+        self,
+        location: Optional[str] = None,
+        type: Optional[str] = None,
+        status: Optional[str] = None,
+        bedroom: Optional[int] = None,
+        price_min: Optional[int] = None,
+        price_max: Optional[int] = None,
+        area_min: Optional[int] = None,
+        area_max: Optional[int] = None,
+        sort: Optional[str] = Query(None, pattern="^-?(price|area)$", description="price, area, -price or -area"),
+    ):
+        self.equals = {
+            field: value
+            for field, value in (("location", location), ("type", type), ("status", status), ("bedroom", bedroom))
+            if value is not None
+        }
+        self.ranges = {"price": (price_min, price_max), "area": (area_min, area_max)}
+        self.order_by = sort.lstrip("-") if sort else None
+        self.descending = bool(sort) and sort.startswith("-")
+
 # GET real estate data
 @support_router.get("/realEstate", response_model=List[RealEstate])
-async def get_real_estate_data(user: UserJSON = Depends(get_current_user)) -> List[RealEstate]:
-    return realEstate
+async def get_real_estate_data(
+    request: Request, filters: RealEstateQuery = Depends(), query: ListQuery = Depends(),
+    user: UserJSON = Depends(get_current_user)
+) -> List[RealEstate]:
+    def rows(snapshot: bool = False):
+        return realEstate.query(filters.equals, filters.ranges, filters.order_by, filters.descending, snapshot)
+
+    if query.format == "ndjson":
+        return render_list(rows(snapshot=True), query, RealEstate.model_fields)
+    # Rows were validated on write, so the cached bytes skip the response model
+    return response_cache.respond(request, (realEstate,), lambda: list(page_rows(rows(), query, RealEstate.model_fields)))
 
 # GET demographic data
 @getter_router.get("/demographic", response_model=List[DemographicData])
-async def get_demographic_data(user: UserJSON = Depends(get_current_user)) -> List[DemographicData]:
-    return demographicData
+async def get_demographic_data(
+    request: Request, query: ListQuery = Depends(), user: UserJSON = Depends(get_current_user)
+) -> List[DemographicData]:
+    if query.format == "ndjson":
+        return render_list(demographicData.snapshot(), query, DemographicData.model_fields)
+    return response_cache.respond(
+        request, (demographicData,), lambda: list(page_rows(demographicData, query, DemographicData.model_fields))
+    )
 
 # GET Real Estate Data by ID
 @support_router.get("/realEstate/{id}", response_model=RealEstate)
-async def get_real_estate_data_by_id(id: int, user: UserJSON = Depends(get_current_user)) -> RealEstate:
-    real_estate_data = next((req for req in realEstate if req.get("id") == id), None)
-    return RealEstate(**real_estate_data)
+async def get_real_estate_data_by_id(request: Request, id: int, user: UserJSON = Depends(get_current_user)) -> RealEstate:
+    real_estate_data = realEstate.get(id)
+    if real_estate_data is None:
+        raise HTTPException(status_code=404, detail="realEstate not found")
+    return response_cache.respond(request, (realEstate,), lambda: real_estate_data)
 
 # GET Demographic Data by Location
 @getter_router.get("/demographic/{location}", response_model=DemographicData)
-async def get_demographic_data_by_location(location: str, user: UserJSON = Depends(get_current_user)) -> DemographicData:
-    demographic_data = next((req for req in demographicData if req.get("location") == location), None)
-    return DemographicData(**demographic_data)
+async def get_demographic_data_by_location(request: Request, location: str, user: UserJSON = Depends(get_current_user)) -> DemographicData:
+    demographic_data = demographicData.get(location)
+    if demographic_data is None:
+        raise HTTPException(status_code=404, detail="demographicData not found")
+    return response_cache.respond(request, (demographicData,), lambda: demographic_data)
+
+#-----------------------------Batch-----------------------------------#
+# Declared before the /{id} and /{location} routes so "batch" is not taken as a path parameter
+
+# At most this many row errors are listed in a batch response
+MAX_REPORTED_ERRORS = 1000
+# An NDJSON import writes its rows in chunks of this many, one journal write each
+IMPORT_CHUNK_ROWS = 10000
+
+class BatchResult:
+    def __init__(self):
+        self.keys = []
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, index: int, detail: Any):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "detail": detail})
+
+    # Only ints, strings and error details: encoded directly, without jsonable_encoder walking every key
+    def response(self, action: str) -> FastJSONResponse:
+        return FastJSONResponse(
+            {action: len(self.keys), "keys": self.keys, "errorCount": self.error_count, "errors": self.errors}
+        )
+
+# Validates one raw row against a model, recording the error instead of failing the batch
+def validate_row(model, index: int, raw: Any, result: BatchResult):
+    if not isinstance(raw, dict):
+        result.error(index, "Row must be a JSON object")
+        return None
+    try:
+        return model(**raw)
+    except ValidationError as e:
+        result.error(index, [{"loc": err["loc"], "msg": err["msg"]} for err in e.errors()])
+        return None
+
+def check_admin(user: UserJSON, detail: str):
+    if not user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+# Inserts validated real estate rows with freshly allocated ids; the caller holds journal.write_lock()
+def insert_real_estate(changes: List[RealEstate], result: BatchResult):
+    rows = []
+    for change in changes:
+        change.id = realEstate.allocator.allocate()
+        rows.append(change.dict())
+    realEstate.insert_many(rows)
+    result.keys.extend(row["id"] for row in rows)
+
+#POST Real Estate Data in batch
+@support_router.post("/realEstate/batch")
+async def addRealEstateBatch(rows: List[Any] = Body(...), user: UserJSON = Depends(get_current_user)):
+    check_admin(user, "You do not have permission to create a new real estate")
+    result = BatchResult()
+    changes = []
+    for index, raw in enumerate(rows):
+        change = validate_row(RealEstate, index, raw, result)
+        if change is not None:
+            changes.append(change)
+    async with journal.write_lock():
+        insert_real_estate(changes, result)
+    return result.response("created")
+
+#POST Real Estate Data as a streamed NDJSON import, one listing per line
+@support_router.post("/realEstate/import")
+async def importRealEstate(request: Request, user: UserJSON = Depends(get_current_user)):
+    check_admin(user, "You do not have permission to create a new real estate")
+    result = BatchResult()
+    changes = []
+    async for line_number, raw, error in read_ndjson(request):
+        if error is not None:
+            result.error(line_number, error)
+            continue
+        change = validate_row(RealEstate, line_number, raw, result)
+        if change is not None:
+            changes.append(change)
+        if len(changes) >= IMPORT_CHUNK_ROWS:
+            # Taken per chunk, never across the reads above: other workers can't write while it is held
+            async with journal.write_lock():
+                insert_real_estate(changes, result)
+            changes = []
+    if changes:
+        async with journal.write_lock():
+            insert_real_estate(changes, result)
+    return result.response("created")
+
+#PUT Real Estate Data in batch, each row identified by its id
+@support_router.put("/realEstate/batch")
+async def updateRealEstateBatch(rows: List[Any] = Body(...), user: UserJSON = Depends(get_current_user)):
+    check_admin(user, "You do not have permission to update this requirement")
+    result = BatchResult()
+    async with journal.write_lock():
+        for index, raw in enumerate(rows):
+            newData = validate_row(RealEstate, index, raw, result)
+            if newData is None:
+                continue
+            if newData.id not in realEstate:
+                result.error(index, "realEstate not found")
+                continue
+            realEstate.put(newData.dict())
+            result.keys.append(newData.id)
+    return result.response("updated")
+
+#DELETE Real Estate Data in batch
+@support_router.delete("/realEstate/batch")
+async def deleteRealEstateBatch(ids: List[int] = Body(...), user: UserJSON = Depends(get_current_user)):
+    check_admin(user, "You do not have permission to delete this requirement")
+    result = BatchResult()
+    async with journal.write_lock():
+        for index, id in enumerate(ids):
+            if realEstate.delete(id) is None:
+                result.error(index, "realEstate not found")
+            else:
+                result.keys.append(id)
+    return result.response("deleted")
+
+#POST Demographic Data in batch
+@admin_router.post("/demographic/batch")
+async def addDemographicBatch(rows: List[Any] = Body(...), user: UserJSON = Depends(get_current_user)):
+    check_admin(user, "You do not have permission to create a new demographic data")
+    result = BatchResult()
+    async with journal.write_lock():
+        for index, raw in enumerate(rows):
+            change = validate_row(DemographicData, index, raw, result)
+            if change is None:
+                continue
+            if change.location in demographicData:
+                result.error(index, "Location already exists")
+                continue
+            demographicData.put(change.dict())
+            result.keys.append(change.location)
+    return result.response("created")
+
+#PUT Demographic Data in batch, each row identified by its location
+@admin_router.put("/demographic/batch")
+async def updateDemographicBatch(rows: List[Any] = Body(...), user: UserJSON = Depends(get_current_user)):
+    check_admin(user, "You do not have permission to update this requirement")
+    result = BatchResult()
+    async with journal.write_lock():
+        for index, raw in enumerate(rows):
+            newData = validate_row(DemographicData, index, raw, result)
+            if newData is None:
+                continue
+            if newData.location not in demographicData:
+                result.error(index, "demographicData not found")
+                continue
+            demographicData.put(newData.dict())
+            result.keys.append(newData.location)
+    return result.response("updated")
+
+#DELETE Demographic Data in batch
+@admin_router.delete("/demographic/batch")
+async def deleteDemographicBatch(locations: List[str] = Body(...), user: UserJSON = Depends(get_current_user)):
+    check_admin(user, "You do not have permission to delete this requirement")
+    result = BatchResult()
+    async with journal.write_lock():
+        for index, location in enumerate(locations):
+            if demographicData.delete(location) is None:
+                result.error(index, "demographicData not found")
+            else:
+                result.keys.append(location)
+    return result.response("deleted")
 
 #-----------------------------Post-----------------------------------#
 #POST Real Estate Data
@@ -234,27 +478,16 @@ async def addRealEstate(change: RealEstate, user: UserJSON = Depends(get_current
     except Exception as e:
         raise HTTPException(status_code=422, detail="Invalid input data")
 
-    realEstate_data = data.get("realEstate")
-
-    # Extracting used IDs
-    used_ids = {realEstate.get("id") for realEstate in realEstate_data}
+    async with journal.write_lock():
+        # Setting the new real estate ID (smallest released ID, else the next new one)
+        change.id = realEstate.allocator.allocate()
 
-    # Finding the smallest available ID
-    available_id = 1
-    while available_id in used_ids:
-        available_id += 1
+        # Adding the new data to the table
+        row = change.dict()
+        realEstate.put(row)
 
-    # Setting the new real estate ID
-    change.id = available_id
-
-    # Adding the new data to the list
-    realEstate_data.append(change.dict())
-
-    # Saving data back to the JSON file
-    with open('data/requirement.json', "w") as write_file:
-        json.dump(data, write_file, indent=4)
-
-    return change  # Returning the Pydantic model directly
+    # The row was validated on the way in, so it is encoded as it is instead of through the response_model
+    return FastJSONResponse(row)
 
 #POST Demographic Data
 @admin_router.post("/demographic", response_model=DemographicData)
@@ -272,28 +505,17 @@ async def addDemographic(change: DemographicData, user: UserJSON = Depends(get_c
     except Exception as e:
         raise HTTPException(status_code=422, detail="Invalid input data")
 
-    demographicData_data = data.get("demographicData", [])
-
-    # Check if the location already exists
-    existing_location = next(
-        (item for item in demographicData_data if item["location"] == change.location),
-        None
-    )
+    async with journal.write_lock():
+        # Check if the location already exists
+        if change.location in demographicData:
+            raise HTTPException(status_code=400, detail="Location already exists")
 
-    if existing_location:
-        raise HTTPException(status_code=400, detail="Location already exists")
-
-    # Append the new demographic data to the list
-    demographicData_data.append(change.dict())
-
-    # Update the data dictionary with the new demographic data
-    data["demographicData"] = demographicData_data
-
-    with open('data/requirement.json', "w") as write_file:
-        json.dump(data, write_file, indent=4)
+        # Add the new demographic data to the table
+        row = change.dict()
+        demographicData.put(row)
 
     # Return the newly added demographic data
-    return change
+    return FastJSONResponse(row)
 
 #-----------------------------Put-----------------------------------#
 # PUT Real Estate Data
@@ -306,14 +528,12 @@ async def updateRealEstate(id: int, newData: RealEstate, user: UserJSON = Depend
             detail="You do not have permission to update this requirement"
         )
     
-    realEstate_data = data.get("realEstate")
-    for i, new in enumerate(realEstate_data):
-        if new.get("id") == id:
+    async with journal.write_lock():
+        if id in realEstate:
             newData.id = id
-            realEstate_data[i] = newData.dict()
-            with open('data/requirement.json', "w") as write_file:
-                json.dump(data, write_file, indent=4)
-            return newData
+            row = newData.dict()
+            realEstate.put(row)
+            return FastJSONResponse(row)
     raise HTTPException(status_code=404, detail="realEstate not found")
 
 # PUT Demographic Data
@@ -326,14 +546,12 @@ async def updateDemographic(location: str, newData: DemographicData, user: UserJ
             detail="You do not have permission to update this requirement"
         )
     
-    demographicData_data = data.get("demographicData")
-    for i, new in enumerate(demographicData_data):
-        if new.get("location") == location:
+    async with journal.write_lock():
+        if location in demographicData:
             newData.location = location
-            demographicData_data[i] = newData.dict()
-            with open('data/requirement.json', "w") as write_file:
-                json.dump(data, write_file, indent=4)
-            return newData
+            row = newData.dict()
+            demographicData.put(row)
+            return FastJSONResponse(row)
     raise HTTPException(status_code=404, detail="demographicData not found")
 
 #------------------------------Delete----------------------------------#
@@ -347,15 +565,12 @@ async def deleteRealEstate(id: int, user: UserJSON = Depends(get_current_user)):
             detail="You do not have permission to delete this requirement"
         )
     
-    realEstate_data = data.get("realEstate")
-    for i, new in enumerate(realEstate_data):
-        if new.get("id") == id:
-            realEstate_data.pop(i)
-            with open('data/requirement.json', "w") as write_file:
-                json.dump(data, write_file, indent=4)
-            return {
-                "message": "Real Estate deleted successfully"
-            }
+    async with journal.write_lock():
+        deleted = realEstate.delete(id)
+    if deleted is not None:
+        return {
+            "message": "Real Estate deleted successfully"
+        }
     raise HTTPException(status_code=404, detail="realEstate not found")
 
 # DELETE Demographic Data
@@ -368,14 +583,10 @@ async def deleteDemographic(location: str, user: UserJSON = Depends(get_current_
             detail="You do not have permission to delete this requirement"
         )
     
-    demographicData_data = data.get("demographicData")
-    
-    for i, new in enumerate(demographicData_data):
-        if new.get("location") == location:
-            demographicData_data.pop(i)
-            with open('data/requirement.json', "w") as write_file:
-                json.dump(data, write_file, indent=4)
-            return {
-                "message": "Demographic Data deleted successfully"
-            }
+    async with journal.write_lock():
+        deleted = demographicData.delete(location)
+    if deleted is not None:
+        return {
+            "message": "Demographic Data deleted successfully"
+        }
     raise HTTPException(status_code=404, detail="demographicData not found")
\ No newline at end of file
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List
+from models.users import UserJSON
+from routes.auth import get_current_user
+from routes.requirements import realEstate, demographicData, sync_tables
+from services.stats import RealEstateStats
+
+stats_router = APIRouter(tags=["Statistik"], dependencies=[Depends(sync_tables)])
+
+# Aggregates are updated on every realEstate mutation, so reads never scan the listings
+real_estate_stats = RealEstateStats(realEstate, demographicData)
+
+
+# GET stats for every location
+@stats_router.get("/locations", response_model=List[dict])
+async def get_location_stats(user: UserJSON = Depends(get_current_user)) -> List[dict]:
+    return real_estate_stats.summaries()
+
+# GET stats for one location
+@stats_router.get("/locations/{location}", response_model=dict)
+async def get_location_stats_by_location(location: str, user: UserJSON = Depends(get_current_user)) -> dict:
+    summary = real_estate_stats.summary(location)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Location not found")
+    return summary
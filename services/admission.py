@@ -0,0 +1,149 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, Request, status
+from services.metrics import admission_rejected
+import config
+
+
+# Token bucket per client: rate tokens per second up to burst, one token per request
+class RateLimiter:
+    def __init__(self, rate: float, burst: int, max_clients: int = config.RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # client key -> (tokens, time of the last update), least recently seen first
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    # 0.0 if the request may go ahead, otherwise the seconds until the client has a token again
+    def acquire(self, key: str) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        bucket = self._buckets.pop(key, None)
+        tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        # An evicted client starts again with a full bucket, which only matters under a flood of new keys
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# At most limit requests at a time; a few more wait (up to max_wait seconds) for a free slot
+class ConcurrencyLimiter:
+    def __init__(self, limit: int, max_waiting: int, max_wait: float):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters: deque = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        if self.limit <= 0:
+            self.in_flight += 1
+            return True
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_waiting:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot over by resolving the waiter, so in_flight stays the same
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            # The slot can be handed over just as the timeout fires (wait_for then still raises
+            # on 3.12); it is ours either way, so use it instead of leaking it
+            return waiter.done() and not waiter.cancelled()
+        except BaseException:
+            # Cancelled right after a slot was handed over: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+# The client a request is counted against: its address, or the first X-Forwarded-For entry
+# behind a trusted proxy (the header is easy to forge, so it is ignored unless configured)
+def client_key(request: Request) -> str:
+    if config.TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return "ip:" + forwarded.split(",")[0].strip()
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+# Admission control for one class of expensive routes: a rate limit per client and a shared
+# concurrency limit. Rejections are immediate (429 or 503 with Retry-After), so a burst on
+# these routes is turned away instead of slowing down every other route
+class RouteClass:
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int, max_waiting: int, max_wait: float):
+        self.name = name
+        self.rate_limiter = RateLimiter(rate, burst)
+        self.concurrency = ConcurrencyLimiter(concurrency, max_waiting, max_wait)
+
+    @asynccontextmanager
+    async def admit(self, key: str):
+        wait = self.rate_limiter.acquire(key)
+        if wait:
+            admission_rejected.inc(self.name, "rate")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, try again later",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+        if not await self.concurrency.acquire():
+            admission_rejected.inc(self.name, "concurrency")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": str(config.ADMISSION_RETRY_AFTER)},
+            )
+        try:
+            yield
+        finally:
+            self.concurrency.release()
+
+    # FastAPI dependency for routes without a user (login, register), limited per client address
+    async def by_client(self, request: Request):
+        async with self.admit(client_key(request)):
+            yield
+
+
+# /token and /register: bcrypt plus a friend-service call
+auth_admission = RouteClass(
+    "auth", config.AUTH_RATE_LIMIT, config.AUTH_RATE_BURST,
+    config.AUTH_CONCURRENCY, config.AUTH_QUEUE, config.AUTH_QUEUE_WAIT,
+)
+# /friend/getListrikRealEstate: upstream fetch plus the join over every listing, limited per user
+listrik_admission = RouteClass(
+    "listrik", config.LISTRIK_RATE_LIMIT, config.LISTRIK_RATE_BURST,
+    config.LISTRIK_CONCURRENCY, config.LISTRIK_QUEUE, config.LISTRIK_QUEUE_WAIT,
+)
+route_classes = [auth_admission, listrik_admission]
@@ -0,0 +1,139 @@
+import asyncio
+import importlib.util
+import math
+import random
+import time
+from typing import Dict
+from fastapi import HTTPException, status
+import httpx
+from services.circuit_breaker import CircuitBreaker
+from services.metrics import friend_seconds
+import config
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+# Upstream answers that are worth another attempt (and count against the circuit breaker)
+RETRY_STATUSES = (502, 503, 504)
+
+
+# Raised without calling the upstream while the circuit breaker is open
+class FriendUnavailable(httpx.HTTPError):
+    def __init__(self, retry_after: float):
+        super().__init__("Friend service is unavailable")
+        self.retry_after = retry_after
+
+
+# One pooled, keep-alive client for the friend service, shared for the app lifetime
+#
+# Calls go through request(): per-call timeouts, jittered retries for idempotent calls and
+# a circuit breaker per operation that fails fast while that part of the upstream keeps failing,
+# so e.g. a broken listrik API does not stop logins from getting a token
+class FriendClient:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._client: httpx.AsyncClient = None
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, operation: str) -> CircuitBreaker:
+        breaker = self.breakers.get(operation)
+        if breaker is None:
+            breaker = self.breakers[operation] = CircuitBreaker(config.FRIEND_BREAKER_THRESHOLD, config.FRIEND_BREAKER_RESET)
+        return breaker
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=config.FRIEND_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.FRIEND_MAX_KEEPALIVE,
+                    keepalive_expiry=config.FRIEND_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(config.FRIEND_TIMEOUT, connect=config.FRIEND_CONNECT_TIMEOUT),
+            )
+        return self._client
+
+    # Full jitter: a random wait up to base * 2^attempt, so retries from many requests spread out
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(config.FRIEND_RETRY_BACKOFF_MAX, config.FRIEND_RETRY_BACKOFF * 2 ** attempt))
+
+    # operation: which circuit breaker the call counts against, e.g. "token" or "listrik"
+    # endpoint: metrics label for urls with path parameters, e.g. "/users/{username}"
+    async def request(self, method: str, url: str, *, operation: str, timeout: float = None,
+                      idempotent: bool = None, endpoint: str = None, **kwargs) -> httpx.Response:
+        breaker = self.breaker(operation)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        attempts = 1 + (config.FRIEND_RETRIES if idempotent else 0)
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=min(timeout, config.FRIEND_CONNECT_TIMEOUT))
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise FriendUnavailable(breaker.retry_after())
+            last = attempt + 1 == attempts
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.LocalProtocolError:
+                # Our own request was malformed (e.g. an empty token in a header), not an upstream failure
+                breaker.release()
+                raise
+            except httpx.TransportError as e:
+                friend_seconds.observe(time.perf_counter() - start, method, endpoint or url, type(e).__name__)
+                breaker.record_failure()
+                if last:
+                    raise
+            except BaseException:
+                breaker.release()
+                raise
+            else:
+                friend_seconds.observe(time.perf_counter() - start, method, endpoint or url, response.status_code)
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if last:
+                    return response
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Maps a failed friend-service call to the response our API returns
+def friend_error(e: httpx.HTTPError, not_found: str = None) -> HTTPException:
+    if isinstance(e, FriendUnavailable):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    if isinstance(e, httpx.HTTPStatusError):
+        if e.response.status_code == 404 and not_found is not None:
+            return HTTPException(status_code=404, detail=not_found)
+        return HTTPException(status_code=e.response.status_code, detail=str(e))
+    # No response at all: timeout or connection error
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Friend service timed out")
+    return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Friend service error: {e}")
+
+
+friend = FriendClient(config.FRIEND_BASE_URL)
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import httpx
+import jwt
+from services.friend_client import friend
+from services.user_store import UserStore
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("token", "expires_at", "credentials", "credentials_until", "refreshing")
+
+    def __init__(self):
+        self.token = ""
+        self.expires_at = 0.0
+        # (username, password) from the last login, kept in memory only so the token can be renewed
+        self.credentials: Optional[Tuple[str, str]] = None
+        self.credentials_until = 0.0
+        self.refreshing: asyncio.Task = None
+
+
+# Keeps every user's token_teman fresh: tokens are cached per user with their expiry,
+# renewed in the background before they run out and once more when the upstream answers 401
+#
+# New tokens are written to the user store, which batches them to disk like any other change
+class FriendTokenManager:
+    def __init__(self, user_store: UserStore):
+        self.user_store = user_store
+        self._entries: Dict[int, _Entry] = {}
+        self._task: asyncio.Task = None
+        self.refreshes = 0
+        self.failures = 0
+        self.retried = 0
+
+    # Expiry of a friend token as a monotonic time; tokens without an exp claim get FRIEND_TOKEN_TTL
+    def _expiry(self, token: str) -> float:
+        try:
+            exp = jwt.decode(token, options={"verify_signature": False, "verify_exp": False}).get("exp")
+        except jwt.PyJWTError:
+            exp = None
+        if exp is None:
+            return time.monotonic() + config.FRIEND_TOKEN_TTL
+        return time.monotonic() + (exp - time.time())
+
+    async def _fetch(self, user_id: int, entry: _Entry) -> str:
+        username, password = entry.credentials
+        # Getting a token has no side effects upstream, so it is safe to retry
+        response = await friend.post("/token/self", data={"username": username, "password": password},
+                                     operation="token", timeout=config.FRIEND_TOKEN_TIMEOUT, idempotent=True)
+        response.raise_for_status()
+        token = response.json().get("access_token") or ""
+        entry.token = token
+        entry.expires_at = self._expiry(token)
+        self.user_store.update_later(user_id, token_teman=token)
+        return token
+
+    def _refreshed(self, entry: _Entry, task: asyncio.Task):
+        entry.refreshing = None
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.failures += 1
+            logger.warning("Failed to refresh friend token: %r", task.exception())
+        else:
+            self.refreshes += 1
+
+    # Starts a refresh for the user unless one is running; None if we have no credentials for them
+    def refresh(self, user_id: int) -> Optional[asyncio.Task]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry.credentials is None:
+            return None
+        if entry.refreshing is None:
+            entry.refreshing = asyncio.ensure_future(self._fetch(user_id, entry))
+            entry.refreshing.add_done_callback(lambda task: self._refreshed(entry, task))
+        return entry.refreshing
+
+    # Called after a successful login; returns the refresh task so the caller can decide how long to wait
+    def login(self, user_id: int, username: str, password: str) -> asyncio.Task:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = self._entries[user_id] = _Entry()
+        entry.credentials = (username, password)
+        entry.credentials_until = time.monotonic() + config.FRIEND_CREDENTIALS_TTL
+        task = self.refresh(user_id)
+        if config.FRIEND_CREDENTIALS_TTL <= 0:
+            # Not kept: the password is only used for the token of this login
+            task.add_done_callback(lambda _: self._forget(entry, username, password))
+        return task
+
+    def _forget(self, entry: _Entry, username: str, password: str):
+        if entry.credentials == (username, password):
+            entry.credentials = None
+
+    # Best token available right now without waiting
+    def peek(self, user_id: int) -> str:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.token and time.monotonic() < entry.expires_at:
+            return entry.token
+        # Not logged in through this process (restart or another worker): use the stored one
+        user = self.user_store.get_by_id(user_id)
+        return (user.get("token_teman") or "") if user is not None else ""
+
+    async def get(self, user_id: int) -> str:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.token:
+            remaining = entry.expires_at - time.monotonic()
+            if remaining > 0:
+                if remaining < config.FRIEND_TOKEN_REFRESH_MARGIN:
+                    self.refresh(user_id)
+                return entry.token
+        task = self.refresh(user_id)
+        if task is not None:
+            try:
+                return await asyncio.shield(task)
+            except (httpx.HTTPError, ValueError):
+                pass
+        return self.peek(user_id)
+
+    # Sends a friend-service request with the user's token; on 401 the token is renewed and the
+    # request sent once more
+    async def call(self, user_id: int, send: Callable[[str], Awaitable[httpx.Response]]) -> httpx.Response:
+        response = await send(await self.get(user_id))
+        if response.status_code == 401:
+            task = self.refresh(user_id)
+            if task is not None:
+                self.retried += 1
+                try:
+                    token = await asyncio.shield(task)
+                except (httpx.HTTPError, ValueError):
+                    return response
+                response = await send(token)
+        return response
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(config.FRIEND_TOKEN_SCAN_INTERVAL)
+            now = time.monotonic()
+            for user_id, entry in list(self._entries.items()):
+                if entry.credentials is not None and now >= entry.credentials_until:
+                    # Idle too long: forget the password, the user has to log in again to renew
+                    entry.credentials = None
+                if entry.credentials is None:
+                    if now >= entry.expires_at and entry.refreshing is None:
+                        del self._entries[user_id]
+                elif entry.expires_at - now < config.FRIEND_TOKEN_REFRESH_MARGIN:
+                    self.refresh(user_id)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [entry.refreshing for entry in self._entries.values() if entry.refreshing is not None]
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._entries),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "retried": self.retried,
+        }
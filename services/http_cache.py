@@ -0,0 +1,80 @@
+import gzip
+import hashlib
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+from fastapi import Request, Response
+import config
+from services.json_codec import dumps
+from services.table import Table
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+# Pre-encoded (and compressed) response bytes per request variant and table version,
+# with strong ETags so polling clients get a 304 while nothing has changed
+class ResponseCache:
+    def __init__(self, max_entries: int = config.RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        # Table versions restart with every process, so ETags also carry a per-process epoch
+        self.epoch = uuid.uuid4().hex
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _get(self, key: tuple):
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def _put(self, key: tuple, body: bytes):
+        self._entries[key] = body
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def respond(self, request: Request, tables: Iterable[Table], build: Callable[[], Any]) -> Response:
+        variant = request.url.path + "?" + "&".join(sorted(str(request.query_params).split("&")))
+        versions = tuple((table.name, table.version) for table in tables)
+
+        plain = self._get((variant, versions, None))
+        if plain is None:
+            self.misses += 1
+            plain = dumps(build())
+            self._put((variant, versions, None), plain)
+        else:
+            self.hits += 1
+
+        encoding = None
+        if len(plain) >= config.RESPONSE_COMPRESS_MIN:
+            accept = request.headers.get("accept-encoding", "")
+            encoding = "br" if brotli is not None and "br" in accept else "gzip" if "gzip" in accept else None
+
+        digest = hashlib.sha1(repr((self.epoch, variant, versions)).encode()).hexdigest()[:20]
+        # Each content-coding is its own representation, so it gets its own strong ETag
+        etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        body = plain
+        if encoding:
+            body = self._get((variant, versions, encoding))
+            if body is None:
+                body = brotli.compress(plain) if encoding == "br" else gzip.compress(plain, compresslevel=6)
+                self._put((variant, versions, encoding), body)
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "notModified": self.not_modified}
+
+
+response_cache = ResponseCache()
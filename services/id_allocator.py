@@ -0,0 +1,43 @@
+import heapq
+from typing import Iterable, List
+
+
+# Hands out integer ids in O(log n): the smallest released id first, else high water + 1
+class IdAllocator:
+    def __init__(self, used_ids: Iterable[int] = (), high_water: int = 0, reuse_released: bool = True):
+        used = set(used_ids)
+        self.high_water = max(high_water, max(used, default=0))
+        self.reuse_released = reuse_released
+        # Min-heap of free ids below the high water mark; the set makes removal lazy
+        self._free: List[int] = []
+        self._free_set = set()
+        if reuse_released:
+            # Rebuilt from the gaps, which also covers ids deleted after the last snapshot
+            self._free = [i for i in range(1, self.high_water + 1) if i not in used]
+            self._free_set = set(self._free)
+
+    def allocate(self) -> int:
+        while self._free:
+            candidate = heapq.heappop(self._free)
+            if candidate in self._free_set:
+                self._free_set.remove(candidate)
+                return candidate
+        self.high_water += 1
+        return self.high_water
+
+    # Marks an id as used, e.g. when a row is written with an explicit id
+    def reserve(self, id: int):
+        if id > self.high_water:
+            previous, self.high_water = self.high_water, id
+            for gap in range(previous + 1, id):
+                self.release(gap)
+        else:
+            self._free_set.discard(id)
+
+    def release(self, id: int):
+        if self.reuse_released and id <= self.high_water and id not in self._free_set:
+            self._free_set.add(id)
+            heapq.heappush(self._free, id)
+
+    def state(self) -> dict:
+        return {"highWater": self.high_water}
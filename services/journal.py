@@ -0,0 +1,410 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager, nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import config
+from services.json_codec import dumps, loads
+from services.persistence import atomic_write
+from services.metrics import persist_seconds
+from services.shared_storage import FileLock, file_state
+from services.snapshots import encode_binary, encode_json, read_binary, read_json
+
+logger = logging.getLogger(__name__)
+
+
+# Replays journal records on top of the snapshot tables
+# keys maps each table name to its primary key field
+def replay(data: dict, records: List[dict], keys: Dict[str, str]):
+    tables = {}
+    for record in records:
+        table = record["table"]
+        if table not in tables:
+            tables[table] = {row[keys[table]]: row for row in data.get(table, [])}
+        if record["op"] == "put":
+            tables[table][record["key"]] = record["value"]
+        elif record["op"] == "delete":
+            tables[table].pop(record["key"], None)
+    for table, rows in tables.items():
+        data[table] = list(rows.values())
+
+
+# Puts and deletes that turn the rows now into the new rows (both by primary key)
+def diff_rows(now: Iterable[dict], new: Iterable[dict], key: str) -> Tuple[List[dict], List]:
+    new_rows = {row[key]: row for row in new}
+    puts, deletes = [], []
+    for row in now:
+        new_row = new_rows.pop(row[key], None)
+        if new_row is None:
+            deletes.append(row[key])
+        elif new_row != row:
+            puts.append(new_row)
+    puts.extend(new_rows.values())
+    return puts, deletes
+
+
+# Append-only NDJSON mutation log with batched fsync and background compaction
+#
+# Compaction writes the snapshot as JSON, or with binary=True as a marshal file next to it
+# (requirement.json -> requirement.snapshot) that loads much faster; load() always reads the
+# newer of the two, so switching the format back and forth never loses data
+#
+# With shared=True several worker processes use the same files: every mutation runs inside
+# write_lock() (an exclusive flock), which first applies what other workers appended and then
+# writes the new records straight to the journal; sync() tails the journal before reads.
+# Compaction and loading another worker's compacted snapshot do their file work and the bulk
+# of the comparison in a thread; only the (usually small) set of changes is applied on the loop.
+# At run time the flock is only taken through FileLock.hold_async(), so waiting for another
+# worker (e.g. one that is compacting) never blocks this worker's event loop
+class Journal:
+    def __init__(self, snapshot_path: str, journal_path: str, keys: Dict[str, str],
+                 interval: float = config.PERSIST_INTERVAL, max_pending: int = config.PERSIST_MAX_DIRTY,
+                 compact_every: int = config.JOURNAL_COMPACT_EVERY, shared: bool = False, binary: bool = False):
+        self.json_path = snapshot_path
+        self.binary_path = os.path.splitext(snapshot_path)[0] + ".snapshot"
+        self.binary = binary
+        # Where compaction writes
+        self.snapshot_path = self.binary_path if binary else self.json_path
+        self.journal_path = journal_path
+        self.keys = keys
+        self.interval = interval
+        self.max_pending = max_pending
+        self.compact_every = compact_every
+        self.shared = shared
+        # Returns the current tables (Table objects or plain values), set by the owner after load()
+        self.snapshot: Callable[[], dict] = None
+        # Tables that records from other workers are applied to (shared mode), see attach()
+        self.tables = {}
+        self.records_since_compaction = 0
+        self.compactions = 0
+        self._buffer: List[bytes] = []
+        self._file = None
+        self._file_lock = FileLock(journal_path + ".lock") if shared else None
+        # Bytes of the journal already applied, and the snapshot file they were applied on
+        self._offset = 0
+        self._snapshot_state = None
+        # Records read by load(), applied to the tables by attach()
+        self._pending: List[dict] = []
+        # Snapshot file the data came from; start() compacts into the configured format if it differs
+        self._loaded_path = None
+        self._unsynced = False
+        # Set while this worker compacts under the exclusive flock: nobody else can write, so
+        # write_lock() only buffers records for the new journal and sync() has nothing to read
+        self._compacting = False
+        self._reload_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task = None
+
+    def _hold(self, exclusive: bool):
+        return self._file_lock.hold(exclusive) if self.shared else nullcontext()
+
+    # Complete records from offset on, and the offset just past the last one
+    def _read_journal(self, offset: int) -> Tuple[List[dict], int]:
+        records = []
+        if not os.path.exists(self.journal_path):
+            return records, 0
+        with open(self.journal_path, "rb") as journal_file:
+            journal_file.seek(offset)
+            for line in journal_file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(loads(line))
+                except ValueError:
+                    break
+                offset += len(line)
+        return records, offset
+
+    def _read_snapshot(self) -> dict:
+        json_state = file_state(self.json_path)
+        binary_state = file_state(self.binary_path)
+        if binary_state is not None and (json_state is None or binary_state[1] >= json_state[1]):
+            self._loaded_path = self.binary_path
+            return read_binary(self.binary_path)
+        self._loaded_path = self.json_path
+        return read_json(self.json_path)
+
+    def _encode_snapshot(self):
+        data = self.snapshot()
+        with persist_seconds.time(self.snapshot_path, "encode"):
+            return encode_binary(data) if self.binary else encode_json(data)
+
+    # The snapshot tables; the journal records on top of them are applied by attach()
+    def load(self) -> dict:
+        with self._hold(exclusive=True):
+            data = self._read_snapshot()
+            self._snapshot_state = file_state(self.snapshot_path)
+            self._pending, self._offset = self._read_journal(0)
+            state = file_state(self.journal_path)
+            if state is not None and state[2] > self._offset:
+                # A torn last line from a crash mid-append; cut it so new records stay readable
+                os.truncate(self.journal_path, self._offset)
+        self.records_since_compaction = len(self._pending)
+        return data
+
+    # Registers the tables built from load() and replays the journal into them. Replaying
+    # through the tables (instead of into the loaded lists) keeps binary snapshot rows packed
+    def attach(self, *tables):
+        self.tables = {table.name: table for table in tables}
+        records, self._pending = self._pending, []
+        for record in records:
+            self._apply(record)
+
+    def put(self, table: str, key, value: dict):
+        self._append({"op": "put", "table": table, "key": key, "value": value})
+
+    def delete(self, table: str, key):
+        self._append({"op": "delete", "table": table, "key": key})
+
+    def _append(self, record: dict):
+        self._buffer.append(dumps(record) + b"\n")
+        if len(self._buffer) >= self.max_pending:
+            self._wakeup.set()
+
+    def _open(self):
+        if self._file is None:
+            # Unbuffered: a failed write must not leave bytes behind in a buffer that a later write flushes
+            self._file = open(self.journal_path, "ab", buffering=0)
+        return self._file
+
+    # Appends the lines and returns the journal size after them. A write that fails partway
+    # (e.g. ENOSPC) is cut back off: load() stops at the first broken line, so a fragment would
+    # hide every record appended after it
+    def _write_lines(self, lines: List[bytes], fsync: bool = True) -> int:
+        fd = self._open().fileno()
+        offset = os.lseek(fd, 0, os.SEEK_END)
+        data = b"".join(lines)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            if fsync:
+                os.fsync(fd)
+        except OSError:
+            try:
+                os.ftruncate(fd, offset)
+            except OSError as e:
+                logger.error("Failed to cut a partial write off %s: %s", self.journal_path, e)
+            raise
+        return offset + len(data)
+
+    def _truncate(self):
+        journal_file = self._open()
+        journal_file.truncate(0)
+        os.fsync(journal_file.fileno())
+
+    #-----------------------------Shared mode-----------------------------------#
+    def _apply(self, record: dict):
+        table = self.tables[record["table"]]
+        if record["op"] == "put":
+            table.put(record["value"], record=False)
+        else:
+            table.delete(record["key"], record=False)
+
+    # Applies what other workers wrote since our last look; the file lock must be held
+    def _catch_up(self):
+        snapshot_state = file_state(self.snapshot_path)
+        if snapshot_state != self._snapshot_state:
+            # Another worker compacted: start over from the new snapshot and its journal.
+            # sync() normally does this off the loop (see _reload()); this is the fallback for
+            # a compaction that lands between sync() and a write
+            data = self._read_snapshot()
+            records, self._offset = self._read_journal(0)
+            replay(data, records, self.keys)
+            for name, table in self.tables.items():
+                table.replace_all(data.get(name, []))
+            self._snapshot_state = snapshot_state
+            self.records_since_compaction = len(records)
+        else:
+            records, self._offset = self._read_journal(self._offset)
+            for record in records:
+                self._apply(record)
+            self.records_since_compaction += len(records)
+
+    # Puts and deletes per table from the current views to the snapshot on disk, or None if
+    # the snapshot was replaced while it was read. Runs in a thread without the file lock
+    def _snapshot_changes(self, views: dict, snapshot_state) -> Optional[dict]:
+        data = self._read_snapshot()
+        if file_state(self.snapshot_path) != snapshot_state:
+            return None
+        return {name: diff_rows(view, data.get(name, []), self.tables[name].key) for name, view in views.items()}
+
+    # Loads a snapshot compacted by another worker: reading and comparing run in a thread
+    # against point-in-time views of the tables, then the changes and the new journal are
+    # applied under the lock. Anything that moved in the meantime is left to _catch_up()
+    async def _reload(self):
+        async with self._reload_lock:
+            snapshot_state = file_state(self.snapshot_path)
+            if snapshot_state == self._snapshot_state:
+                return
+            views = {name: table.snapshot() for name, table in self.tables.items()}
+            versions = {name: table.version for name, table in self.tables.items()}
+            with persist_seconds.time(self.snapshot_path, "reload"):
+                changes = await asyncio.to_thread(self._snapshot_changes, views, snapshot_state)
+            if changes is None or self._compacting:
+                return
+            async with self._file_lock.hold_async(exclusive=False):
+                if file_state(self.snapshot_path) != snapshot_state or self._snapshot_state == snapshot_state:
+                    return
+                if any(table.version != versions[name] for name, table in self.tables.items()):
+                    return
+                for name, (puts, deletes) in changes.items():
+                    table = self.tables[name]
+                    for key in deletes:
+                        table.delete(key, record=False)
+                    for row in puts:
+                        table.put(row, record=False)
+                records, self._offset = self._read_journal(0)
+                for record in records:
+                    self._apply(record)
+                self._snapshot_state = snapshot_state
+                self.records_since_compaction = len(records)
+
+    # Cheap check before reads: two stats, and the lock only when something changed
+    async def sync(self):
+        if not self.shared or self._compacting:
+            return
+        if file_state(self.snapshot_path) != self._snapshot_state:
+            await self._reload()
+            if self._compacting:
+                return
+        journal_state = file_state(self.journal_path)
+        journal_size = journal_state[2] if journal_state else 0
+        if file_state(self.snapshot_path) == self._snapshot_state and journal_size == self._offset:
+            return
+        async with self._file_lock.hold_async(exclusive=False):
+            self._catch_up()
+
+    # Wrap every check-and-mutate section (async with, no awaits inside); a no-op in local mode
+    @asynccontextmanager
+    async def write_lock(self):
+        if not self.shared or self._compacting:
+            yield
+            return
+        async with self._file_lock.hold_async(exclusive=True):
+            self._catch_up()
+            try:
+                yield
+            finally:
+                self._publish()
+
+    # Writes the buffered records to the journal, visible to the other workers right away (fsync
+    # is still batched); the file lock must be held. On failure they stay buffered for the next try
+    def _publish(self):
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        try:
+            self._offset = self._write_lines(lines, fsync=False)
+        except OSError:
+            self._buffer[:0] = lines
+            raise
+        self.records_since_compaction += len(lines)
+        self._unsynced = True
+
+    def _replace_snapshot(self, content: bytes):
+        atomic_write(self.snapshot_path, content)
+        self._truncate()
+
+    async def _compact_shared(self, force: bool):
+        await self.sync()
+        async with self._file_lock.hold_async(exclusive=True):
+            self._catch_up()
+            if not force and self.records_since_compaction < self.compact_every:
+                return
+            # Encoded on the loop so the tables can't change mid-dump; the write and the truncate
+            # go to a thread. Until they are done our own writes stay buffered (see write_lock())
+            # and go into the new journal afterwards, like in local mode
+            content = self._encode_snapshot()
+            self._compacting = True
+            try:
+                with persist_seconds.time(self.snapshot_path, "write"):
+                    await asyncio.to_thread(self._replace_snapshot, content)
+                self._unsynced = False
+                self.records_since_compaction = 0
+                self.compactions += 1
+            finally:
+                self._compacting = False
+                self._snapshot_state = file_state(self.snapshot_path)
+                # 0 after the truncate, or the old journal (still ours) if it failed
+                self._offset = os.fstat(self._open().fileno()).st_size
+                self._publish()
+
+    #-----------------------------Background work-----------------------------------#
+    async def flush(self):
+        if self.shared:
+            if self._buffer:
+                # Mutations made outside write_lock(); publish them now
+                async with self.write_lock():
+                    pass
+            if self._unsynced:
+                self._unsynced = False
+                with persist_seconds.time(self.journal_path, "fsync"):
+                    await asyncio.to_thread(os.fsync, self._open().fileno())
+            return
+        async with self._lock:
+            if not self._buffer:
+                return
+            lines, self._buffer = self._buffer, []
+            try:
+                with persist_seconds.time(self.journal_path, "append"):
+                    await asyncio.to_thread(self._write_lines, lines)
+            except OSError:
+                # Put the lines back in front of anything appended meanwhile
+                self._buffer[:0] = lines
+                raise
+            self.records_since_compaction += len(lines)
+
+    async def compact(self, force: bool = True):
+        if self.shared:
+            with persist_seconds.time(self.snapshot_path, "compact"):
+                await self._compact_shared(force)
+            return
+        # The journal must be complete before the snapshot is taken, so replaying it
+        # over the new snapshot (after a crash before truncation) is harmless
+        await self.flush()
+        async with self._lock:
+            content = self._encode_snapshot()
+            with persist_seconds.time(self.snapshot_path, "write"):
+                await asyncio.to_thread(atomic_write, self.snapshot_path, content)
+            # Records appended while the snapshot was written stay buffered for the new journal
+            await asyncio.to_thread(self._truncate)
+            self.records_since_compaction = 0
+            self.compactions += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if self.records_since_compaction >= self.compact_every:
+                    await self.compact(force=False)
+            except OSError as e:
+                logger.error("Failed to persist %s: %s", self.journal_path, e)
+
+    async def start(self):
+        if self._loaded_path != self.snapshot_path:
+            # SNAPSHOT_FORMAT changed (or first start in binary mode): write the configured
+            # format now, so the next start loads it
+            await self.compact()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self.records_since_compaction:
+            await self.compact()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
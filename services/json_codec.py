@@ -0,0 +1,38 @@
+import json
+from typing import Any, Union
+from fastapi.responses import JSONResponse
+import config
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# JSON_ENCODER=json forces the standard library even when orjson is installed
+_orjson = orjson if config.JSON_ENCODER == "orjson" else None
+
+
+# Compact JSON (no indent, no spaces) as UTF-8 bytes, for responses and data files alike
+def dumps(value: Any) -> bytes:
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(value, option=_orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Values orjson refuses (e.g. integers beyond 64 bits) still encode the slow way
+            pass
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+# Default response class of the app (see main.py)
+#
+# FastAPI still runs the route's response_model and jsonable_encoder before render(); routes that
+# return rows validated on write pass them to this class directly and skip both
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
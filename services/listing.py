@@ -0,0 +1,108 @@
+from itertools import islice
+from typing import AsyncIterator, Iterable, Optional
+from fastapi import HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from services.json_codec import FastJSONResponse, dumps, loads
+
+# Rows per chunk when streaming NDJSON
+STREAM_CHUNK_ROWS = 500
+# Longest accepted line of an NDJSON request body; a listing is well under 1 KB
+MAX_NDJSON_LINE = 64 * 1024
+
+
+# Query parameters shared by the list endpoints (use with Depends())
+class ListQuery:
+    def __init__(
+        self,
+        offset: int = Query(0, ge=0, description="Number of rows to skip"),
+        limit: Optional[int] = Query(None, ge=1, description="Maximum number of rows to return"),
+        fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. id,price"),
+        format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams one row per line"),
+    ):
+        self.offset = offset
+        self.limit = limit
+        self.fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        self.format = format
+
+
+# Pulls, projects and encodes one chunk of rows at a time, between sends
+async def _ndjson(rows: Iterable[dict]) -> AsyncIterator[bytes]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, STREAM_CHUNK_ROWS))
+        if not chunk:
+            return
+        yield b"".join(dumps(row) + b"\n" for row in chunk)
+
+
+# Applies offset/limit and field projection to a row iterable, lazily
+def page_rows(rows: Iterable[dict], query: ListQuery, allowed_fields: Iterable[str]) -> Iterable[dict]:
+    stop = None if query.limit is None else query.offset + query.limit
+    page = islice(rows, query.offset, stop)
+
+    if query.fields:
+        unknown = [field for field in query.fields if field not in allowed_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        page = ({field: row.get(field) for field in query.fields} for row in page)
+    return page
+
+
+# Applies paging, projection and the output format to a row iterable
+# The rows are encoded as they are: stored rows were validated on write, so the route's
+# response_model (still used for the docs) is not run over every row again
+#
+# NDJSON is streamed straight from the iterable, which is read across awaits: pass a stable
+# view (Table.snapshot() or query(snapshot=True)), never an iterator over a live table
+def render_list(rows: Iterable[dict], query: ListQuery, allowed_fields: Iterable[str]):
+    page = page_rows(rows, query, allowed_fields)
+
+    if query.format == "ndjson":
+        return StreamingResponse(_ndjson(page), media_type="application/x-ndjson")
+    return FastJSONResponse(list(page))
+
+
+# Yields (line number, parsed value, None) or (line number, None, error detail) for every
+# non-empty line of an NDJSON request body, as it arrives
+#
+# Only the unfinished last line of a chunk is kept (as parts, joined once its newline arrives),
+# and a line over MAX_NDJSON_LINE is dropped and reported instead of being buffered
+async def read_ndjson(request: Request) -> AsyncIterator[tuple]:
+    parts = []
+    size = 0
+    oversize = False
+    line_number = 0
+    async for chunk in request.stream():
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end < 0:
+                break
+            line_number += 1
+            if oversize or size + end - start > MAX_NDJSON_LINE:
+                yield line_number, None, f"Line longer than {MAX_NDJSON_LINE} bytes"
+            else:
+                parts.append(chunk[start:end])
+                line = b"".join(parts)
+                if line.strip():
+                    yield (line_number, *_parse_line(line))
+            parts, size, oversize = [], 0, False
+            start = end + 1
+        if start < len(chunk) and not oversize:
+            parts.append(chunk[start:])
+            size += len(chunk) - start
+            if size > MAX_NDJSON_LINE:
+                parts, size, oversize = [], 0, True
+    if oversize:
+        yield line_number + 1, None, f"Line longer than {MAX_NDJSON_LINE} bytes"
+    elif parts:
+        line = b"".join(parts)
+        if line.strip():
+            yield (line_number + 1, *_parse_line(line))
+
+
+def _parse_line(line: bytes) -> tuple:
+    try:
+        return loads(line), None
+    except ValueError:
+        return None, "Invalid JSON"
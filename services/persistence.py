@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import tempfile
+from typing import Any, Callable, List, Union
+import config
+from services.json_codec import dumps
+from services.metrics import persist_seconds
+
+logger = logging.getLogger(__name__)
+
+
+# Write to a temp file in the same directory, then rename over the target
+def atomic_write(path: str, content: Union[str, bytes]):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        # mkstemp creates the file as 0600; keep the permissions of the file being replaced
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, "wb" if isinstance(content, bytes) else "w") as tmp_file:
+            tmp_file.write(content)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# Batches changes to a JSON file and flushes them in the background
+class WriteBehindFile:
+    def __init__(self, path: str, snapshot: Callable[[], Any],
+                 interval: float = config.PERSIST_INTERVAL, max_dirty: int = config.PERSIST_MAX_DIRTY):
+        self.path = path
+        self.snapshot = snapshot
+        self.interval = interval
+        self.max_dirty = max_dirty
+        self.dirty = 0
+        self.flushes = 0
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task = None
+
+    def mark_dirty(self):
+        self.dirty += 1
+        if self.dirty >= self.max_dirty:
+            self._wakeup.set()
+
+    async def flush(self):
+        async with self._lock:
+            if not self.dirty:
+                return
+            # Encode on the loop so the data can't change mid-dump; only the I/O goes to a thread
+            with persist_seconds.time(self.path, "encode"):
+                content = dumps(self.snapshot())
+            self.dirty = 0
+            with persist_seconds.time(self.path, "write"):
+                await asyncio.to_thread(atomic_write, self.path, content)
+            self.flushes += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except OSError as e:
+                # Keep the data dirty and try again on the next round
+                self.dirty += 1
+                logger.error("Failed to persist %s: %s", self.path, e)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Every background writer in the app (anything with start/stop), run from the lifespan in main.py
+files: List = []
+
+
+def register(file):
+    files.append(file)
+    return file
+
+
+async def start_all():
+    for file in files:
+        await file.start()
+
+
+async def stop_all():
+    for file in files:
+        await file.stop()
@@ -0,0 +1,79 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# (inode, mtime, size) of a file, or None if it does not exist; a change means another process wrote it
+def file_state(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+# Re-entrant inter-process lock (flock) on a side file, shared by all workers
+class FileLock:
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("STORAGE_MODE=shared needs fcntl file locking (Linux/macOS)")
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+        # Turns for hold_async(): flock never blocks another holder on the same file descriptor
+        self._turn = asyncio.Lock()
+
+    @contextmanager
+    def hold(self, exclusive: bool):
+        if self._depth:
+            # Already held by this process: nest, but never try to upgrade a shared lock
+            if exclusive and not self._exclusive:
+                raise RuntimeError(f"Cannot upgrade shared lock on {self.path}")
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self._depth = 1
+        self._exclusive = exclusive
+        try:
+            yield
+        finally:
+            self._depth = 0
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # Like hold(), for coroutines: the flock is tried without blocking and retried after a short
+    # sleep, so while another worker holds it (e.g. through a compaction) this worker's event loop
+    # keeps serving other requests. Never nested; holders in this process take turns
+    @asynccontextmanager
+    async def hold_async(self, exclusive: bool, max_delay: float = 0.05):
+        async with self._turn:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            delay = 0.001
+            while True:
+                try:
+                    fcntl.flock(self._fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(delay)
+                    delay = min(max_delay, delay * 2)
+            self._depth = 1
+            self._exclusive = exclusive
+            try:
+                yield
+            finally:
+                self._depth = 0
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
@@ -0,0 +1,48 @@
+import marshal
+import mmap
+from services.compact_rows import PackedRows
+from services.json_codec import dumps, loads
+from services.table import Table
+
+# Binary snapshot: this header, then the marshal-encoded payload
+#   {"tables": {name: (fields or None, rows)}, "data": {other top-level keys}}
+# marshal only holds plain Python values, loads at C speed and keeps shared strings shared;
+# the format belongs to this app's own data files and is not meant for exchange
+BINARY_MAGIC = b"RESNAP1\n"
+
+
+def encode_json(data: dict) -> bytes:
+    return dumps({name: value.rows() if isinstance(value, Table) else value for name, value in data.items()})
+
+
+def encode_binary(data: dict) -> bytes:
+    tables = {}
+    rest = {}
+    for name, value in data.items():
+        if isinstance(value, Table):
+            value = value.snapshot()
+        if isinstance(value, PackedRows):
+            tables[name] = (value.fields, value.rows)
+        else:
+            rest[name] = value
+    return BINARY_MAGIC + marshal.dumps({"tables": tables, "data": rest})
+
+
+def read_json(path: str) -> dict:
+    with open(path, "rb") as json_file:
+        return loads(json_file.read())
+
+
+# Tables come back as PackedRows, so a Table with the same codec takes the tuples as they are
+def read_binary(path: str) -> dict:
+    with open(path, "rb") as snapshot_file:
+        # Mapped instead of read, so the file is not copied into a bytes object first
+        with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+                raise ValueError(f"{path} is not a binary snapshot")
+            with memoryview(mapped) as view, view[len(BINARY_MAGIC):] as payload:
+                snapshot = marshal.loads(payload)
+    data = snapshot["data"]
+    for name, (fields, rows) in snapshot["tables"].items():
+        data[name] = PackedRows(fields, rows)
+    return data
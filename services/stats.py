@@ -0,0 +1,90 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional
+from services.table import Table
+
+
+# Running aggregates of the listings in one location
+class LocationStats:
+    def __init__(self):
+        self.count = 0
+        self.price_sum = 0
+        self.prices: List[int] = []  # sorted, for the median
+        self.price_per_area_sum = 0.0
+        self.price_per_area_count = 0
+        self.multiplier_sum = 0.0
+
+    # bulk=True appends the price unsorted; the caller sorts prices once afterwards
+    def add(self, row: dict, sign: int, bulk: bool = False):
+        self.count += sign
+        self.price_sum += sign * row["price"]
+        self.multiplier_sum += sign * row["multiplier"]
+        if row["area"]:
+            self.price_per_area_sum += sign * row["price"] / row["area"]
+            self.price_per_area_count += sign
+        if bulk:
+            self.prices.append(row["price"])
+        elif sign > 0:
+            insort(self.prices, row["price"])
+        else:
+            del self.prices[bisect_left(self.prices, row["price"])]
+
+    def median_price(self) -> Optional[float]:
+        n = len(self.prices)
+        if not n:
+            return None
+        middle = n // 2
+        return self.prices[middle] if n % 2 else (self.prices[middle - 1] + self.prices[middle]) / 2
+
+
+# Per-location listing aggregates, kept up to date from the realEstate table's change feed
+class RealEstateStats:
+    def __init__(self, real_estate: Table, demographic: Table):
+        self.demographic = demographic
+        self.locations: Dict[str, LocationStats] = {}
+        # Startup: one sort per location instead of an insort per row
+        for row in real_estate:
+            stats = self.locations.get(row["location"])
+            if stats is None:
+                stats = self.locations[row["location"]] = LocationStats()
+            stats.add(row, 1, bulk=True)
+        for stats in self.locations.values():
+            stats.prices.sort()
+        real_estate.subscribe(self._on_change)
+
+    def _on_change(self, old: Optional[dict], new: Optional[dict]):
+        if old is not None:
+            stats = self.locations[old["location"]]
+            stats.add(old, -1)
+            if not stats.count:
+                del self.locations[old["location"]]
+        if new is not None:
+            self.locations.setdefault(new["location"], LocationStats()).add(new, 1)
+
+    # Joins the aggregates with demographicData at read time, O(1) per location
+    def summary(self, location: str) -> Optional[dict]:
+        stats = self.locations.get(location)
+        demographic = self.demographic.get(location)
+        if stats is None and demographic is None:
+            return None
+        stats = stats or LocationStats()
+        population = demographic["population"] if demographic else None
+        density = demographic["populationDensity"] if demographic else None
+        return {
+            "location": location,
+            "count": stats.count,
+            "meanPrice": stats.price_sum / stats.count if stats.count else None,
+            "medianPrice": stats.median_price(),
+            "meanPricePerArea": (
+                stats.price_per_area_sum / stats.price_per_area_count if stats.price_per_area_count else None
+            ),
+            "meanMultiplier": stats.multiplier_sum / stats.count if stats.count else None,
+            "population": population,
+            "populationDensity": density,
+            "listingsPerPopulation": stats.count / population if population else None,
+            "listingsPerPopulationDensity": stats.count / density if density else None,
+        }
+
+    def summaries(self) -> List[dict]:
+        locations = dict.fromkeys(self.locations)
+        locations.update(dict.fromkeys(self.demographic.keys()))
+        return [self.summary(location) for location in locations]
@@ -0,0 +1,371 @@
+import sys
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from services.compact_rows import PackedRows, RowCodec
+
+
+# Index of (value, key) pairs kept sorted by value, for range scans and ordering
+#
+# The pairs live in sorted chunks of at most 2 * chunk_size entries (the SortedList layout), so
+# an insert or delete shifts one chunk instead of the whole index. Positions used by bounds()
+# and keys() are global, counted across the chunks
+class SortedIndex:
+    def __init__(self, chunk_size: int = 1000):
+        self.chunk_size = chunk_size
+        self._chunks: List[List[Tuple[Any, Any]]] = []
+        # Last (largest) pair of every chunk, for finding the chunk of a pair
+        self._maxes: List[Tuple[Any, Any]] = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        for chunk in self._chunks:
+            yield from chunk
+
+    def add(self, value, key):
+        entry = (value, key)
+        self._len += 1
+        if not self._chunks:
+            self._chunks.append([entry])
+            self._maxes.append(entry)
+            return
+        i = min(bisect_left(self._maxes, entry), len(self._chunks) - 1)
+        chunk = self._chunks[i]
+        insort(chunk, entry)
+        self._maxes[i] = chunk[-1]
+        if len(chunk) > 2 * self.chunk_size:
+            self._chunks[i:i + 1] = [chunk[:self.chunk_size], chunk[self.chunk_size:]]
+            self._maxes[i:i + 1] = [chunk[self.chunk_size - 1], chunk[-1]]
+
+    # Bulk load: one sort (which merges the sorted runs) and a re-chunk instead of an insort per pair.
+    # A batch that is small next to the index is cheaper to add pair by pair
+    def load(self, entries: Iterable[Tuple[Any, Any]]):
+        entries = list(entries)
+        if len(entries) * 8 < self._len:
+            for entry in entries:
+                self.add(*entry)
+            return
+        merged = list(self)
+        merged.extend(entries)
+        merged.sort()
+        self._chunks = [merged[i:i + self.chunk_size] for i in range(0, len(merged), self.chunk_size)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._len = len(merged)
+
+    def remove(self, value, key):
+        entry = (value, key)
+        i = bisect_left(self._maxes, entry)
+        if i == len(self._chunks):
+            return
+        chunk = self._chunks[i]
+        j = bisect_left(chunk, entry)
+        if j < len(chunk) and chunk[j] == entry:
+            del chunk[j]
+            self._len -= 1
+            if chunk:
+                self._maxes[i] = chunk[-1]
+            else:
+                del self._chunks[i]
+                del self._maxes[i]
+
+    # Global position of the first pair with value >= low (right=False) or value > high (right=True)
+    def _position(self, value, right: bool) -> int:
+        find = bisect_right if right else bisect_left
+        i = find(self._maxes, value, key=lambda entry: entry[0])
+        if i == len(self._chunks):
+            return self._len
+        return sum(map(len, self._chunks[:i])) + find(self._chunks[i], value, key=lambda entry: entry[0])
+
+    # Position bounds of the pairs with low <= value <= high (None means unbounded)
+    def bounds(self, low=None, high=None) -> Tuple[int, int]:
+        start = 0 if low is None else self._position(low, right=False)
+        stop = self._len if high is None else self._position(high, right=True)
+        return start, max(start, stop)
+
+    def keys(self, start: int, stop: int, descending: bool = False) -> Iterator:
+        if start >= stop:
+            return
+        # Chunk and offset of the first position to visit
+        position = stop - 1 if descending else start
+        i = 0
+        while position >= len(self._chunks[i]):
+            position -= len(self._chunks[i])
+            i += 1
+        remaining = stop - start
+        if descending:
+            while remaining:
+                chunk = self._chunks[i]
+                for j in range(position, max(-1, position - remaining), -1):
+                    yield chunk[j][1]
+                remaining -= min(remaining, position + 1)
+                i -= 1
+                position = len(self._chunks[i]) - 1 if i >= 0 else 0
+        else:
+            while remaining:
+                chunk = self._chunks[i]
+                end = min(len(chunk), position + remaining)
+                for j in range(position, end):
+                    yield chunk[j][1]
+                remaining -= end - position
+                i += 1
+                position = 0
+
+
+# In-memory table with a primary key index and optional secondary indexes
+# Rows keep insertion order, so rows() matches the order of the old lists
+#
+# With a codec the rows are stored compactly (see RowCodec) and turned back into dicts on
+# the way out; callers always see dicts either way
+class Table:
+    def __init__(self, name: str, key: str, rows: Iterable[dict] = (),
+                 indexes: Iterable[str] = (), sorted_indexes: Iterable[str] = (),
+                 journal=None, allocator=None, codec: RowCodec = None):
+        self.name = name
+        self.key = key
+        self.journal = journal
+        # Optional IdAllocator kept in sync with inserts and deletes
+        self.allocator = allocator
+        self.codec = codec
+        # primary key -> row (or its encoded form with a codec)
+        self._rows: Dict[Any, Any] = {}
+        # field -> value -> ordered set (dict) of primary keys
+        self._indexes: Dict[str, Dict[Any, Dict[Any, None]]] = {field: {} for field in indexes}
+        self._sorted: Dict[str, SortedIndex] = {field: SortedIndex() for field in sorted_indexes}
+        self._indexed_fields = (*self._indexes, *self._sorted)
+        # Called with (old_row, new_row) after every put/delete; None marks insert/delete
+        self._listeners: List[Callable[[Optional[dict], Optional[dict]], None]] = []
+        # Bumped on every mutation; drives ETags and cached response bytes
+        self.version = 0
+        # Rows as of a version, shared by readers until the next mutation (see snapshot())
+        self._snapshot: PackedRows = None
+        self._snapshot_version = -1
+        # The initial rows fill the sorted indexes in bulk afterwards
+        sorted_entries = {field: [] for field in self._sorted}
+        hash_fields = tuple(self._indexes)
+        if codec is not None and isinstance(rows, PackedRows) and rows.fields == codec.fields:
+            # Already encoded (binary snapshot): stored as is, decoded only to build the indexes
+            pairs = ((stored, codec.decode(stored)) for stored in rows.rows)
+        else:
+            pairs = ((None, row) for row in rows)
+        for stored, row in pairs:
+            row_key = row[key]
+            self._rows[row_key] = self._store(row) if stored is None else stored
+            self._index_fields(row, hash_fields)
+            for field, entries in sorted_entries.items():
+                entries.append((row.get(field), row_key))
+        for field, entries in sorted_entries.items():
+            self._sorted[field].load(entries)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> Iterator[dict]:
+        if self.codec is None:
+            return iter(self._rows.values())
+        return map(self.codec.decode, self._rows.values())
+
+    def keys(self):
+        return self._rows.keys()
+
+    def rows(self) -> List[dict]:
+        return list(iter(self))
+
+    # Point-in-time view of the stored rows, for readers that keep iterating across an await and
+    # for binary snapshots. One copy of the row references per version, shared until the next
+    # mutation; rows are replaced on put and never changed in place, so the view needs no lock
+    def snapshot(self) -> PackedRows:
+        if self._snapshot_version != self.version:
+            self._snapshot = PackedRows(self.codec.fields if self.codec is not None else None, list(self._rows.values()))
+            self._snapshot_version = self.version
+        return self._snapshot
+
+    def _decode(self, stored):
+        if self.codec is None or stored is None:
+            return stored
+        return self.codec.decode(stored)
+
+    def subscribe(self, listener: Callable[[Optional[dict], Optional[dict]], None]):
+        self._listeners.append(listener)
+
+    def get(self, key) -> Optional[dict]:
+        return self._decode(self._rows.get(key))
+
+    def find(self, field: str, value) -> List[dict]:
+        keys = self._indexes[field].get(value, {})
+        return [self._decode(self._rows[key]) for key in keys]
+
+    # Rows matching every equality (hash indexed) and inclusive range (sorted index) predicate.
+    # The smallest index bucket or range slice drives the scan; the rest is checked per row,
+    # so a selective query only touches its matching rows
+    #
+    # snapshot=True collects the matching stored rows up front (references only, nothing is
+    # decoded) into a PackedRows that stays valid across awaits, e.g. for streaming
+    def query(self, equals: Dict[str, Any] = None, ranges: Dict[str, Tuple[Any, Any]] = None,
+              order_by: str = None, descending: bool = False, snapshot: bool = False) -> Iterable[dict]:
+        equals = equals or {}
+        ranges = {field: bounds for field, bounds in (ranges or {}).items() if bounds != (None, None)}
+        slices = {field: self._sorted[field].bounds(*bounds) for field, bounds in ranges.items()}
+        if order_by is not None and order_by not in slices:
+            slices[order_by] = self._sorted[order_by].bounds()
+
+        # (size, field) of every candidate source
+        sources = [(len(self._indexes[field].get(value, ())), field) for field, value in equals.items()]
+        sources += [(stop - start, field) for field, (start, stop) in slices.items() if field in ranges]
+        driver = min(sources)[1] if sources else None
+        if order_by is not None and (driver is None or slices[order_by][1] - slices[order_by][0] <= min(sources)[0]):
+            driver = order_by
+
+        # Filters and sorting read the stored rows directly; with a codec only the rows that
+        # are actually returned get decoded into dicts
+        get = dict.get if self.codec is None else self.codec.value
+
+        def matches(row) -> bool:
+            for field, value in equals.items():
+                if get(row, field) != value:
+                    return False
+            for field, (low, high) in ranges.items():
+                value = get(row, field)
+                if (low is not None and value < low) or (high is not None and value > high):
+                    return False
+            return True
+
+        if driver is None:
+            if snapshot:
+                return self.snapshot()
+            keys = self._rows.keys()
+        elif driver in self._indexes:
+            keys = self._indexes[driver].get(equals[driver], {})
+        else:
+            keys = self._sorted[driver].keys(*slices[driver], descending=driver == order_by and descending)
+        rows = (row for row in map(self._rows.__getitem__, keys) if matches(row))
+
+        if order_by is not None and driver != order_by:
+            rows = iter(sorted(rows, key=lambda row: get(row, order_by), reverse=descending))
+        if snapshot:
+            return PackedRows(self.codec.fields if self.codec is not None else None, list(rows))
+        return rows if self.codec is None else map(self.codec.decode, rows)
+
+    def _index_fields(self, row: dict, fields: Iterable[str]):
+        key = row[self.key]
+        for field in fields:
+            if field in self._indexes:
+                self._indexes[field].setdefault(row.get(field), {})[key] = None
+            else:
+                self._sorted[field].add(row.get(field), key)
+
+    def _unindex(self, row: dict, fields: Iterable[str]):
+        key = row[self.key]
+        for field in fields:
+            if field in self._indexes:
+                index = self._indexes[field]
+                bucket = index.get(row.get(field))
+                if bucket is not None:
+                    bucket.pop(key, None)
+                    if not bucket:
+                        del index[row.get(field)]
+            else:
+                self._sorted[field].remove(row.get(field), key)
+
+    # Categorical values (the hash-indexed fields) are interned, so a million rows share
+    # one string per location/type/status instead of carrying a copy each
+    def _intern(self, row: dict):
+        for field in self._indexes:
+            value = row.get(field)
+            if type(value) is str:
+                row[field] = sys.intern(value)
+
+    def _store(self, row: dict):
+        self._intern(row)
+        return row if self.codec is None else self.codec.encode(row)
+
+    def _insert(self, row: dict):
+        self._rows[row[self.key]] = self._store(row)
+        self._index_fields(row, self._indexed_fields)
+
+    # Insert or replace the row with the same primary key
+    # record=False applies a change that is already in the journal (e.g. from another worker)
+    def put(self, row: dict, record: bool = True) -> dict:
+        key = row[self.key]
+        old = self._decode(self._rows.get(key))
+        if old is None:
+            self._insert(row)
+            if self.allocator is not None:
+                self.allocator.reserve(key)
+        else:
+            # Only move index entries whose value changed, so buckets keep their order
+            changed = [field for field in self._indexed_fields if old.get(field) != row.get(field)]
+            self._unindex(old, changed)
+            self._rows[key] = self._store(row)
+            self._index_fields(row, changed)
+        if record and self.journal is not None:
+            self.journal.put(self.name, row[self.key], row)
+        self.version += 1
+        for listener in self._listeners:
+            listener(old, row)
+        return row
+
+    def delete(self, key, record: bool = True) -> Optional[dict]:
+        row = self._decode(self._rows.pop(key, None))
+        if row is None:
+            return None
+        self._unindex(row, self._indexed_fields)
+        if self.allocator is not None:
+            self.allocator.release(key)
+        if record and self.journal is not None:
+            self.journal.delete(self.name, key)
+        self.version += 1
+        for listener in self._listeners:
+            listener(row, None)
+        return row
+
+    # Inserts many new rows at once: hash indexes per row, sorted indexes through one load() per
+    # field instead of an add per row, and one version bump. Rows whose key is already in the
+    # table (or earlier in the batch) go through put()
+    def insert_many(self, rows: Iterable[dict], record: bool = True) -> List[dict]:
+        sorted_entries = {field: [] for field in self._sorted}
+        hash_fields = tuple(self._indexes)
+        inserted = []
+
+        def load_sorted():
+            for field, entries in sorted_entries.items():
+                self._sorted[field].load(entries)
+                entries.clear()
+
+        for row in rows:
+            key = row[self.key]
+            if key in self._rows:
+                # put() must see the sorted entries of the batch so far
+                load_sorted()
+                self.put(row, record)
+                continue
+            self._rows[key] = self._store(row)
+            self._index_fields(row, hash_fields)
+            for field, entries in sorted_entries.items():
+                entries.append((row.get(field), key))
+            if self.allocator is not None:
+                self.allocator.reserve(key)
+            if record and self.journal is not None:
+                self.journal.put(self.name, key, row)
+            inserted.append(row)
+        load_sorted()
+        if inserted:
+            self.version += 1
+        for row in inserted:
+            for listener in self._listeners:
+                listener(None, row)
+        return inserted
+
+    # Brings the table to exactly these rows through put/delete, so indexes, listeners
+    # and the version stay consistent; nothing is journaled
+    def replace_all(self, rows: Iterable[dict]):
+        new_rows = {row[self.key]: row for row in rows}
+        for key in [key for key in self._rows if key not in new_rows]:
+            self.delete(key, record=False)
+        for key, row in new_rows.items():
+            if self._decode(self._rows.get(key)) != row:
+                self.put(row, record=False)
@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+from models.users import UserJSON
+
+
+# Bounded LRU/TTL cache of verified tokens -> UserJSON
+class TokenCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        # token -> (user, expires_at)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[UserJSON]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: UserJSON, exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl
+        # Never keep a token past its own exp claim
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        if token in self._entries:
+            self._remove(token)
+        self._entries[token] = (user, expires_at)
+        self._tokens_by_user.setdefault(user.id, set()).add(token)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, token: str):
+        user, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user.id]
+
+    def invalidate_user(self, user_id: int):
+        for token in list(self._tokens_by_user.get(user_id, ())):
+            self._remove(token)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,49 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+
+# Caches one upstream payload for ttl seconds; concurrent misses share a single fetch
+class CachedFetch:
+    def __init__(self, loader: Callable[[], Awaitable[Any]], ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self._value = None
+        self._expires_at = 0.0
+        self._inflight: asyncio.Task = None
+        # Bumped on invalidate so a fetch started earlier can't store stale data
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self):
+        if self._value is not None and time.monotonic() < self._expires_at:
+            self.hits += 1
+            return self._value
+        if self._inflight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            self._inflight = asyncio.create_task(self._load(self._generation))
+        # shield: a cancelled caller must not cancel the fetch the others wait on
+        return await asyncio.shield(self._inflight)
+
+    async def _load(self, generation: int):
+        try:
+            value = await self.loader()
+            if generation == self._generation:
+                self._value = value
+                self._expires_at = time.monotonic() + self.ttl
+            return value
+        finally:
+            if generation == self._generation:
+                self._inflight = None
+
+    def invalidate(self):
+        self._generation += 1
+        self._value = None
+        self._inflight = None
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
@@ -0,0 +1,154 @@
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from services.id_allocator import IdAllocator
+from services.json_codec import dumps, loads
+from services.metrics import persist_seconds
+from services.persistence import WriteBehindFile, atomic_write
+from services.shared_storage import FileLock, file_state
+
+
+# In-memory user repository with hash indexes by id and username
+#
+# With shared=True several worker processes use the same file: mutations run inside
+# write_lock() and are written through immediately, and sync() reloads the file when
+# another worker changed it. Updates made with update_later() (renewed friend tokens) are
+# only batched and merged into the file on the next write or flush
+class UserStore:
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared
+        self.users: List[dict] = []
+        self._by_id: Dict[int, dict] = {}
+        # Old data may contain duplicate usernames, so each key maps to a list
+        self._by_username: Dict[str, List[dict]] = {}
+        # Called with the user id whenever a user record changes
+        self._listeners: List[Callable[[int], None]] = []
+        # Fields from update_later() not yet in the file (shared mode only), by user id
+        self._pending: Dict[int, dict] = {}
+        # Batched writes; register it with services.persistence
+        self.file = _PendingFlush(self) if shared else WriteBehindFile(path, lambda: self.users)
+        self._file_lock = FileLock(path + ".lock") if shared else None
+        self._state = None
+        self.ids: IdAllocator = None
+        self._load()
+
+    def _load(self):
+        with open(self.path, "rb") as json_file:
+            users = loads(json_file.read())
+        self._state = file_state(self.path)
+        old_by_id = self._by_id
+        # Keep the same list object, other modules hold a reference to it
+        self.users[:] = users
+        self._by_id = {}
+        self._by_username = {}
+        for user in self.users:
+            self._index(user)
+        # Our own updates not written yet stay on top of what was loaded
+        for user_id, fields in self._pending.items():
+            if user_id in self._by_id:
+                self._by_id[user_id].update(fields)
+        # User ids are never reused: an old token must not resolve to a new account
+        high_water = self.ids.high_water if self.ids is not None else 0
+        self.ids = IdAllocator(self._by_id, high_water, reuse_released=False)
+        for user_id, user in self._by_id.items():
+            if old_by_id and old_by_id.get(user_id) != user:
+                for listener in self._listeners:
+                    listener(user_id)
+
+    def _index(self, user: dict):
+        self._by_id[user["id"]] = user
+        self._by_username.setdefault(user["username"], []).append(user)
+
+    def __len__(self):
+        return len(self.users)
+
+    def subscribe(self, listener: Callable[[int], None]):
+        self._listeners.append(listener)
+
+    # Reloads the users if another worker wrote the file (no-op unless shared)
+    def sync(self):
+        if self.shared and file_state(self.path) != self._state:
+            with self._file_lock.hold(exclusive=False):
+                self._load()
+
+    # Wrap every check-and-mutate section; persists the users afterwards
+    @contextmanager
+    def write_lock(self):
+        if not self.shared:
+            try:
+                yield
+            finally:
+                self.file.mark_dirty()
+            return
+        with self._file_lock.hold(exclusive=True):
+            if file_state(self.path) != self._state:
+                self._load()
+            try:
+                yield
+            finally:
+                atomic_write(self.path, dumps(self.users))
+                self._state = file_state(self.path)
+                self._pending.clear()
+
+    def get_by_id(self, user_id: int) -> Optional[dict]:
+        return self._by_id.get(user_id)
+
+    def get_by_username(self, username: str) -> List[dict]:
+        return self._by_username.get(username, [])
+
+    def add(self, user: dict):
+        self.users.append(user)
+        self._index(user)
+        self.ids.reserve(user["id"])
+
+    def remove(self, user_id: int):
+        user = self._by_id.pop(user_id)
+        self.users.remove(user)
+        same_name = self._by_username[user["username"]]
+        same_name.remove(user)
+        if not same_name:
+            del self._by_username[user["username"]]
+        self._pending.pop(user_id, None)
+        self.ids.release(user_id)
+        for listener in self._listeners:
+            listener(user_id)
+
+    def update(self, user_id: int, **fields) -> dict:
+        # id and username are index keys and cannot be changed here
+        user = self._by_id[user_id]
+        user.update(fields)
+        for listener in self._listeners:
+            listener(user_id)
+        return user
+
+    # Like update() in write_lock(), for changes that may reach the file a little later: in
+    # shared mode they are kept until the next write or flush instead of rewriting the file now
+    def update_later(self, user_id: int, **fields) -> dict:
+        if not self.shared:
+            with self.write_lock():
+                return self.update(user_id, **fields)
+        user = self.update(user_id, **fields)
+        self._pending.setdefault(user_id, {}).update(fields)
+        self.file.mark_dirty()
+        return user
+
+
+# Flushes a shared store's pending updates through write_lock(), which merges them with what
+# other workers wrote; runs on the loop because the merge reloads the in-memory users
+class _PendingFlush(WriteBehindFile):
+    def __init__(self, store: UserStore):
+        super().__init__(store.path, lambda: store.users)
+        self.store = store
+
+    async def flush(self):
+        async with self._lock:
+            if not self.dirty:
+                return
+            self.dirty = 0
+            if not self.store._pending:
+                # Already written by another write_lock()
+                return
+            with persist_seconds.time(self.path, "write"):
+                with self.store.write_lock():
+                    pass
+            self.flushes += 1
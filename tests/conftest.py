@@ -0,0 +1,58 @@
+# The app under test runs in-process against tools/friend_stub.py, both through httpx.ASGITransport
+#
+# The routes load data/... relative to the working directory when they are imported, so the
+# tests chdir to a copy of data/ first and the real files are never touched
+import os
+import shutil
+import sys
+import tempfile
+import httpx
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="tests-")
+shutil.copytree(os.path.join(REPO_ROOT, "data"), os.path.join(WORKDIR, "data"),
+                ignore=shutil.ignore_patterns("*.journal", "*.lock", "*.snapshot"))
+os.chdir(WORKDIR)
+sys.path.insert(0, REPO_ROOT)
+
+# No jitter sleeps between friend-service retries, and no rate limits (every test client is one address)
+os.environ.update(FRIEND_BASE_URL="http://friend", FRIEND_RETRY_BACKOFF="0", AUTH_RATE_LIMIT="0", LISTRIK_RATE_LIMIT="0")
+
+import config  # noqa: E402
+import main  # noqa: E402
+from services.friend_client import friend  # noqa: E402
+from tools import friend_stub  # noqa: E402
+
+ADMIN = {"username": "Pak IGBN", "password": "TST"}
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+# The module-level state of the app (tables, caches, locks) lives on one event loop for the whole session
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def app():
+    async with main.app.router.lifespan_context(main.app):
+        friend._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=friend_stub.app), base_url=config.FRIEND_BASE_URL)
+        yield main.app
+
+
+@pytest.fixture
+async def client(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+async def admin_headers(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/token", data=ADMIN)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
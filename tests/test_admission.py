@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from services.admission import ConcurrencyLimiter, RouteClass
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_rate_limit_answers_429_with_retry_after():
+    route_class = RouteClass("test", rate=1, burst=2, concurrency=0, max_waiting=0, max_wait=0)
+    for _ in range(2):
+        async with route_class.admit("ip:1"):
+            pass
+    with pytest.raises(HTTPException) as raised:
+        async with route_class.admit("ip:1"):
+            pass
+    assert raised.value.status_code == 429
+    assert raised.value.headers["Retry-After"] == "1"
+    # Other clients have their own bucket
+    async with route_class.admit("ip:2"):
+        pass
+
+
+async def test_full_queue_answers_503_and_slots_are_handed_over():
+    route_class = RouteClass("test", rate=0, burst=0, concurrency=1, max_waiting=1, max_wait=5)
+    limiter = route_class.concurrency
+    entered = []
+
+    async def request(name: str, hold: asyncio.Event):
+        async with route_class.admit("ip:1"):
+            entered.append(name)
+            await hold.wait()
+
+    first, second = asyncio.Event(), asyncio.Event()
+    tasks = [asyncio.create_task(request("first", first))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("second", second)))
+    await asyncio.sleep(0)
+    assert (limiter.in_flight, limiter.waiting) == (1, 1)
+
+    with pytest.raises(HTTPException) as raised:
+        async with route_class.admit("ip:1"):
+            pass
+    assert raised.value.status_code == 503
+
+    first.set()
+    second.set()
+    await asyncio.gather(*tasks)
+    assert entered == ["first", "second"]
+    assert (limiter.in_flight, limiter.waiting) == (0, 0)
+
+
+async def test_waiter_gives_up_after_max_wait():
+    limiter = ConcurrencyLimiter(limit=1, max_waiting=1, max_wait=0.01)
+    assert await limiter.acquire()
+    assert not await limiter.acquire()
+    assert limiter.waiting == 0
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+async def test_slot_handed_over_as_the_wait_times_out_is_not_lost(monkeypatch):
+    limiter = ConcurrencyLimiter(limit=1, max_waiting=1, max_wait=5)
+    assert await limiter.acquire()
+
+    # release() resolves the waiter, then the timeout fires anyway
+    async def racing_wait_for(waiter, timeout):
+        limiter.release()
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(asyncio, "wait_for", racing_wait_for)
+    assert await limiter.acquire()
+    monkeypatch.undo()
+    assert (limiter.in_flight, limiter.waiting) == (1, 0)
+    limiter.release()
+    assert limiter.in_flight == 0
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import jwt
+import pytest
+from routes.auth import JWT_SECRET, friend_tokens, token_cache, user_store
+
+pytestmark = pytest.mark.anyio
+
+RAKA = 2
+
+
+def bearer(user_id: int, **claims) -> dict:
+    token = jwt.encode({"sub": user_store.get_by_id(user_id)["username"], "id": user_id, **claims}, JWT_SECRET)
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def cache_stats(client, headers) -> dict:
+    response = await client.get("/token/cache-stats", headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_cached_token_is_a_hit(client):
+    headers = bearer(RAKA)
+    assert (await client.get("/users/me", headers=headers)).json()["id"] == RAKA
+    before = await cache_stats(client, headers)
+    assert (await client.get("/users/me", headers=headers)).json()["id"] == RAKA
+    after = await cache_stats(client, headers)
+    # Both calls to the stats route hit the cache too
+    assert after["hits"] - before["hits"] == 2 and after["misses"] == before["misses"]
+
+
+async def test_cached_token_expires_with_its_exp(client):
+    exp = int(time.time()) + 2
+    headers = bearer(RAKA, exp=exp)
+    assert (await client.get("/users/me", headers=headers)).status_code == 200
+    assert token_cache.get(headers["Authorization"][7:]) is not None
+    # Older PyJWT only rejects the token once the whole second after exp has started
+    await asyncio.sleep(exp + 1 - time.time() + 0.1)
+    response = await client.get("/users/me", headers=headers)
+    assert response.status_code == 401 and response.json()["detail"] == "Invalid token"
+
+
+async def test_user_change_invalidates_cached_tokens(client):
+    headers = bearer(RAKA)
+    assert (await client.get("/users/me", headers=headers)).json()["is_admin"] is True
+    try:
+        with user_store.write_lock():
+            user_store.update(RAKA, is_admin=False)
+        assert (await client.get("/users/me", headers=headers)).json()["is_admin"] is False
+    finally:
+        with user_store.write_lock():
+            user_store.update(RAKA, is_admin=True)
+
+
+async def test_friend_token_refresh_invalidates_cached_tokens(client):
+    headers = bearer(RAKA)
+    with user_store.write_lock():
+        user_store.update(RAKA, token_teman="stale")
+    assert (await client.get("/users/me", headers=headers)).json()["token_teman"] == "stale"
+
+    token = await friend_tokens.login(RAKA, "Raka", "secret")
+    assert token == "stub-Raka"
+    assert (await client.get("/users/me", headers=headers)).json()["token_teman"] == token
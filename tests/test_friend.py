@@ -0,0 +1,73 @@
+import httpx
+import pytest
+import config
+from routes.auth import friend_tokens, user_store
+from routes.requirements import listrik_cache
+from services.friend_client import friend
+from tools import friend_stub
+
+pytestmark = pytest.mark.anyio
+
+
+# Every friend-service call answers 503, except getting a token
+@pytest.fixture
+def failing_upstream(app, monkeypatch):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path == "/token/self":
+            return httpx.Response(200, json={"access_token": "mock-token"})
+        return httpx.Response(503)
+
+    stub_client, breakers = friend._client, friend.breakers
+    friend._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url=config.FRIEND_BASE_URL)
+    friend.breakers = {}
+    monkeypatch.setattr(config, "FRIEND_BREAKER_RESET", 60.0)
+    listrik_cache.invalidate()
+    yield calls
+    friend._client, friend.breakers = stub_client, breakers
+    listrik_cache.invalidate()
+
+
+async def test_listrik_join_through_the_stub(client, admin_headers):
+    listrik_cache.invalidate()
+    response = await client.get("/friend/getListrikRealEstate", headers=admin_headers)
+    assert response.status_code == 200
+    rows = response.json()
+    assert rows and rows[0]["realEstateID"] == rows[0]["realEstateData"]["id"]
+    assert set(rows[0]["listrikData"]) == {"tanggal", "jam", "jumlahListrik"}
+
+
+async def test_open_breaker_answers_503_without_calling_upstream(client, admin_headers, failing_upstream):
+    # Each request tries 1 + FRIEND_RETRIES times, every 503 counts as a failure
+    while friend.breaker("listrik").state != "open":
+        response = await client.get("/friend/getListrikRealEstate", headers=admin_headers)
+        assert response.status_code == 503
+    calls = len(failing_upstream)
+
+    response = await client.get("/friend/getListrikRealEstate", headers=admin_headers)
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert len(failing_upstream) == calls
+
+
+async def test_open_listrik_breaker_still_lets_tokens_through(client, admin_headers, failing_upstream):
+    while friend.breaker("listrik").state != "open":
+        await client.get("/friend/getListrikRealEstate", headers=admin_headers)
+
+    assert await friend_tokens.login(2, "Raka", "secret") == "mock-token"
+    assert friend.breaker("token").state == "closed"
+
+
+async def test_failed_friend_registration_can_be_retried(client, failing_upstream):
+    user = {"username": "retried", "password": "secret"}
+    response = await client.post("/register", json=user)
+    assert response.status_code == 503
+    assert failing_upstream == ["/register"]
+    assert user_store.get_by_username("retried") == []
+
+    friend._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=friend_stub.app), base_url=config.FRIEND_BASE_URL)
+    response = await client.post("/register", json=user)
+    assert response.status_code == 200
+    assert [found["id"] for found in user_store.get_by_username("retried")] == [response.json()["id"]]
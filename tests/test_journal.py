@@ -0,0 +1,64 @@
+import errno
+import json
+import os
+import pytest
+from services import journal as journal_module
+from services.journal import Journal
+from services.table import Table
+
+pytestmark = pytest.mark.anyio
+
+
+def open_journal(tmp_path):
+    snapshot = tmp_path / "requirement.json"
+    if not snapshot.exists():
+        snapshot.write_text(json.dumps({"realEstate": []}))
+    journal = Journal(str(snapshot), str(tmp_path / "requirement.journal"), {"realEstate": "id"})
+    data = journal.load()
+    table = Table("realEstate", "id", data.get("realEstate", []), journal=journal)
+    journal.attach(table)
+    journal.snapshot = lambda: {"realEstate": table}
+    return journal, table
+
+
+async def test_failed_append_leaves_no_fragment(tmp_path, monkeypatch):
+    journal, table = open_journal(tmp_path)
+    table.put({"id": 1, "name": "before"})
+    await journal.flush()
+
+    # The disk fills up halfway through the next append
+    real_write = os.write
+
+    def write_half(fd, data):
+        real_write(fd, bytes(data[:len(data) // 2]))
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(journal_module.os, "write", write_half)
+    table.put({"id": 2, "name": "failed"})
+    with pytest.raises(OSError):
+        await journal.flush()
+    monkeypatch.undo()
+
+    table.put({"id": 3, "name": "after"})
+    await journal.flush()
+    journal._file.close()
+
+    _, reloaded = open_journal(tmp_path)
+    assert sorted(reloaded.keys()) == [1, 2, 3]
+
+
+async def test_torn_last_line_is_cut_on_load(tmp_path):
+    journal, table = open_journal(tmp_path)
+    table.put({"id": 1})
+    await journal.flush()
+    journal._file.close()
+    with open(tmp_path / "requirement.journal", "ab") as journal_file:
+        journal_file.write(b'{"op":"put","table":"realEst')
+
+    journal, table = open_journal(tmp_path)
+    assert list(table.keys()) == [1]
+    table.put({"id": 2})
+    await journal.flush()
+    journal._file.close()
+    _, reloaded = open_journal(tmp_path)
+    assert sorted(reloaded.keys()) == [1, 2]
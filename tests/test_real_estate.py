@@ -0,0 +1,136 @@
+import os
+import pytest
+import config
+from routes import requirements
+from routes.auth import user_store
+from services.journal import Journal
+from services.json_codec import dumps
+from services.table import Table
+from test_auth import RAKA, bearer
+
+pytestmark = pytest.mark.anyio
+
+
+def listing(**fields) -> dict:
+    row = {
+        "id": 0, "name": "test", "address": "Jl. Test No. 1", "location": "Bandung", "price": 100000,
+        "area": 90, "bedroom": 3, "bathroom": 2, "description": "test", "image": "https://example.com/a.jpg",
+        "type": "Rumah", "status": "Dijual", "multiplier": 1.5,
+    }
+    row.update(fields)
+    return row
+
+
+# The tables as a fresh process would load them: snapshot plus journal replay
+def reload_tables() -> dict:
+    journal = Journal("data/requirement.json", config.REQUIREMENT_JOURNAL, {"realEstate": "id", "demographicData": "location"})
+    data = journal.load()
+    tables = {"realEstate": Table("realEstate", "id", data.get("realEstate", [])),
+              "demographicData": Table("demographicData", "location", data.get("demographicData", []))}
+    journal.attach(*tables.values())
+    return tables
+
+
+async def test_crud_round_trip_survives_restart(client, admin_headers):
+    response = await client.post("/support/realEstate", json=listing(name="created"), headers=admin_headers)
+    assert response.status_code == 200
+    row_id = response.json()["id"]
+
+    response = await client.put(f"/support/realEstate/{row_id}", json=listing(name="updated"), headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json() == listing(id=row_id, name="updated")
+
+    response = await client.get(f"/support/realEstate/{row_id}", headers=admin_headers)
+    assert response.json()["name"] == "updated"
+
+    response = await client.post("/support/realEstate", json=listing(name="deleted"), headers=admin_headers)
+    deleted_id = response.json()["id"]
+    response = await client.delete(f"/support/realEstate/{deleted_id}", headers=admin_headers)
+    assert response.status_code == 200
+    response = await client.get(f"/support/realEstate/{deleted_id}", headers=admin_headers)
+    assert response.status_code == 404
+
+    await requirements.journal.flush()
+    assert os.path.getsize(config.REQUIREMENT_JOURNAL) > 0
+    tables = reload_tables()
+    assert tables["realEstate"].get(row_id) == listing(id=row_id, name="updated")
+    assert deleted_id not in tables["realEstate"]
+    assert dumps(tables["realEstate"].rows()) == dumps(requirements.realEstate.rows())
+
+
+async def test_deleted_id_is_reused(client, admin_headers):
+    response = await client.post("/support/realEstate", json=listing(), headers=admin_headers)
+    row_id = response.json()["id"]
+    await client.delete(f"/support/realEstate/{row_id}", headers=admin_headers)
+
+    response = await client.post("/support/realEstate", json=listing(name="again"), headers=admin_headers)
+    assert response.json()["id"] == row_id
+
+
+async def test_matching_etag_gets_304(client, admin_headers):
+    response = await client.get("/support/realEstate/1", headers=admin_headers)
+    etag = response.headers["ETag"]
+
+    response = await client.get("/support/realEstate/1", headers={**admin_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    row = {**requirements.realEstate.get(1), "bathroom": 7}
+    await client.put("/support/realEstate/1", json=row, headers=admin_headers)
+    response = await client.get("/support/realEstate/1", headers={**admin_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+async def test_batch_reports_bad_rows_and_keeps_the_rest(client, admin_headers):
+    rows = [listing(name="ok"), listing(price="not a number"), "not an object", listing(name="ok too")]
+    response = await client.post("/support/realEstate/batch", json=rows, headers=admin_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 2 and body["errorCount"] == 2
+    assert [error["index"] for error in body["errors"]] == [1, 2]
+    assert body["errors"][1]["detail"] == "Row must be a JSON object"
+    for row_id in body["keys"]:
+        assert requirements.realEstate.get(row_id)["name"].startswith("ok")
+
+    response = await client.request("DELETE", "/support/realEstate/batch", json=[body["keys"][0], 999999],
+                                    headers=admin_headers)
+    body = response.json()
+    assert body["deleted"] == 1
+    assert body["errors"] == [{"index": 1, "detail": "realEstate not found"}]
+
+
+async def test_ndjson_import_reports_bad_lines(client, admin_headers):
+    lines = [dumps(listing(name="line 1")), b"{not json", b"", dumps(listing(name="line 4", area="big"))]
+    response = await client.post("/support/realEstate/import", content=b"\n".join(lines) + b"\n",
+                                 headers={**admin_headers, "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 1 and body["errorCount"] == 2
+    assert body["errors"][0] == {"index": 2, "detail": "Invalid JSON"}
+    assert body["errors"][1]["index"] == 4
+    assert requirements.realEstate.get(body["keys"][0])["name"] == "line 1"
+
+
+async def test_writes_need_a_token(client):
+    response = await client.post("/support/realEstate", json=listing())
+    assert response.status_code == 401
+
+
+async def test_writes_need_an_admin(client):
+    existing = next(iter(requirements.realEstate.keys()))
+    count = len(requirements.realEstate)
+    headers = bearer(RAKA)
+    try:
+        with user_store.write_lock():
+            user_store.update(RAKA, is_admin=False)
+        responses = [
+            await client.post("/support/realEstate", json=listing(), headers=headers),
+            await client.put(f"/support/realEstate/{existing}", json=listing(id=existing), headers=headers),
+            await client.delete(f"/support/realEstate/{existing}", headers=headers),
+        ]
+    finally:
+        with user_store.write_lock():
+            user_store.update(RAKA, is_admin=True)
+    assert [response.status_code for response in responses] == [403, 403, 403]
+    assert len(requirements.realEstate) == count and existing in requirements.realEstate
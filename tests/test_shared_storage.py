@@ -0,0 +1,133 @@
+# STORAGE_MODE=shared with two real uvicorn workers (separate processes) on one data folder
+import asyncio
+import json
+import os
+import shutil
+import httpx
+import pytest
+from benchmarks.run import free_port, start_server, stop_server, wait_ready
+from conftest import ADMIN, REPO_ROOT
+from services.shared_storage import FileLock
+from test_real_estate import listing
+
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.skipif(os.name != "posix", reason="shared mode needs fcntl file locking"),
+]
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    shutil.copytree(os.path.join(REPO_ROOT, "data"), tmp_path / "data",
+                    ignore=shutil.ignore_patterns("*.journal", "*.lock", "*.snapshot"))
+    return tmp_path
+
+
+@pytest.fixture
+def servers(workdir):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    stub_port = free_port()
+    app_env = dict(env, STORAGE_MODE="shared", FRIEND_BASE_URL=f"http://127.0.0.1:{stub_port}",
+                   JOURNAL_COMPACT_EVERY="40", PERSIST_INTERVAL="0.1", AUTH_RATE_LIMIT="0")
+    processes = []
+
+    def start(module: str, port: int, server_env: dict) -> str:
+        process = start_server(module, port, str(workdir), server_env, f"{module.split(':')[0]}-{port}.log")
+        processes.append(process)
+        url = f"http://127.0.0.1:{port}"
+        wait_ready(f"{url}/docs", process, 60)
+        return url
+
+    start("tools.friend_stub:app", stub_port, env)
+    workers = [start("main:app", free_port(), app_env) for _ in range(2)]
+
+    def restart() -> str:
+        for process in processes[1:]:
+            stop_server(process)
+        return start("main:app", free_port(), app_env)
+
+    yield workers, restart
+    for process in processes:
+        stop_server(process)
+
+
+async def test_workers_share_writes_ids_and_compacted_state(workdir, servers):
+    (first, second), restart = servers
+    async with httpx.AsyncClient(timeout=30) as client:
+        response = await client.post(f"{first}/token", data=ADMIN)
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        # Concurrent creates on both workers: every id is handed out once
+        async def create(url: str, name: str) -> int:
+            response = await client.post(f"{url}/support/realEstate", json=listing(name=name), headers=headers)
+            assert response.status_code == 200, response.text
+            return response.json()["id"]
+
+        created = await asyncio.gather(*(create((first, second)[i % 2], f"shared {i}") for i in range(60)))
+        assert len(set(created)) == len(created)
+
+        # Each worker sees the other's writes, updates and deletes
+        for i, row_id in enumerate(created):
+            other = (second, first)[i % 2]
+            response = await client.get(f"{other}/support/realEstate/{row_id}", headers=headers)
+            assert response.json()["name"] == f"shared {i}"
+        response = await client.put(f"{first}/support/realEstate/{created[0]}", json=listing(name="updated"),
+                                    headers=headers)
+        assert response.status_code == 200
+        response = await client.delete(f"{second}/support/realEstate/{created[1]}", headers=headers)
+        assert response.status_code == 200
+        response = await client.get(f"{second}/support/realEstate/{created[0]}", headers=headers)
+        assert response.json()["name"] == "updated"
+        response = await client.get(f"{first}/support/realEstate/{created[1]}", headers=headers)
+        assert response.status_code == 404
+
+        # 60+ records with JOURNAL_COMPACT_EVERY=40: a worker has compacted (some of) them into the snapshot
+        for _ in range(50):
+            with open(workdir / "data" / "requirement.json", "rb") as snapshot_file:
+                if set(created) & {row["id"] for row in json.load(snapshot_file)["realEstate"]}:
+                    break
+            await asyncio.sleep(0.1)
+        else:
+            pytest.fail("the records were never compacted into the snapshot")
+        # Writes after the compaction still reach the other worker
+        late = await create(second, "after compaction")
+        response = await client.get(f"{first}/support/realEstate/{late}", headers=headers)
+        assert response.json()["name"] == "after compaction"
+
+        # Both workers stopped, one started again: snapshot plus journal give the same rows
+        url = restart()
+        for row_id in [*created[2:], late]:
+            response = await client.get(f"{url}/support/realEstate/{row_id}", headers=headers)
+            assert response.status_code == 200
+        response = await client.get(f"{url}/support/realEstate/{created[0]}", headers=headers)
+        assert response.json()["name"] == "updated"
+        response = await client.get(f"{url}/support/realEstate/{created[1]}", headers=headers)
+        # Unless the late create got the deleted id back (released ids are reused)
+        assert response.status_code == 404 or (late == created[1] and response.json()["name"] == "after compaction")
+
+
+async def test_waiting_for_the_file_lock_keeps_the_loop_running(tmp_path):
+    path = str(tmp_path / "data.lock")
+    # Separate descriptors conflict like separate processes do
+    other_worker, this_worker = FileLock(path), FileLock(path)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    async def take():
+        async with this_worker.hold_async(exclusive=True):
+            pass
+
+    ticker = asyncio.create_task(tick())
+    with other_worker.hold(exclusive=True):
+        waiting = asyncio.create_task(take())
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        ticks_while_waiting = ticks
+    await asyncio.wait_for(waiting, 1)
+    ticker.cancel()
+    assert ticks_while_waiting >= 5
@@ -0,0 +1,108 @@
+import json
+import os
+import pytest
+from services.compact_rows import PackedRows, RowCodec
+from services.journal import Journal
+from services.snapshots import BINARY_MAGIC, encode_binary, read_binary
+from services.table import Table
+
+pytestmark = pytest.mark.anyio
+
+FIELDS = ("id", "name", "price")
+ROWS = [{"id": i, "name": f"row {i}", "price": i * 1000} for i in range(1, 21)]
+
+
+def open_tables(tmp_path, binary: bool, codec: RowCodec = None):
+    journal = Journal(str(tmp_path / "requirement.json"), str(tmp_path / "requirement.journal"),
+                      {"realEstate": "id"}, binary=binary)
+    data = journal.load()
+    table = Table("realEstate", "id", data.get("realEstate", []), sorted_indexes=("price",),
+                  journal=journal, codec=codec)
+    journal.attach(table)
+    journal.snapshot = lambda: {"realEstate": table, "idAllocator": {"realEstate": {"highWater": 20}}}
+    return journal, table
+
+
+def write_json(tmp_path, rows):
+    (tmp_path / "requirement.json").write_text(json.dumps({"realEstate": rows}))
+
+
+async def test_json_snapshot_migrates_to_binary(tmp_path):
+    write_json(tmp_path, ROWS)
+    journal, table = open_tables(tmp_path, binary=False)
+    table.put({"id": 21, "name": "journaled", "price": 1})
+    table.delete(1)
+    await journal.flush()
+    journal._file.close()
+
+    # SNAPSHOT_FORMAT=binary from now on: start() writes the binary snapshot right away
+    journal, table = open_tables(tmp_path, binary=True, codec=RowCodec(FIELDS))
+    expected = table.rows()
+    await journal.start()
+    await journal.stop()
+    with open(tmp_path / "requirement.snapshot", "rb") as snapshot_file:
+        assert snapshot_file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    assert os.path.getsize(tmp_path / "requirement.journal") == 0
+
+    journal, table = open_tables(tmp_path, binary=True, codec=RowCodec(FIELDS))
+    assert journal._loaded_path.endswith(".snapshot")
+    assert table.rows() == expected
+    assert 1 not in table and table.get(21)["name"] == "journaled"
+    assert read_binary(str(tmp_path / "requirement.snapshot"))["idAllocator"] == {"realEstate": {"highWater": 20}}
+
+
+async def test_matching_fields_keep_the_stored_tuples(tmp_path, monkeypatch):
+    packed = PackedRows(FIELDS, [tuple(row.values()) for row in ROWS])
+    (tmp_path / "requirement.snapshot").write_bytes(encode_binary({"realEstate": packed}))
+    monkeypatch.setattr(RowCodec, "encode", lambda codec, row: pytest.fail("row encoded again"))
+    _, table = open_tables(tmp_path, binary=True, codec=RowCodec(FIELDS))
+    monkeypatch.undo()
+    assert list(table._rows.values()) == packed.rows
+    assert table.rows() == ROWS
+
+
+@pytest.mark.parametrize("snapshot_fields", [("id", "name", "price", "legacy"), ("price", "name", "id")])
+async def test_field_set_mismatch_decodes_and_encodes_again(tmp_path, snapshot_fields):
+    # Written by a build with other fields (or another order) than the current model
+    rows = [{field: row.get(field, "old") for field in snapshot_fields} for row in ROWS]
+    packed = PackedRows(snapshot_fields, [tuple(row.values()) for row in rows])
+    (tmp_path / "requirement.snapshot").write_bytes(encode_binary({"realEstate": packed}))
+
+    _, table = open_tables(tmp_path, binary=True, codec=RowCodec(FIELDS))
+    assert table.rows() == rows
+    assert [row["id"] for row in table.query(ranges={"price": (5000, 7000)})] == [5, 6, 7]
+    # A row in the current fields is stored compactly again
+    table.put({"id": 1, "name": "current", "price": 5})
+    assert type(table._rows[1]) is tuple and table.get(1) == {"id": 1, "name": "current", "price": 5}
+
+
+async def test_newer_snapshot_wins_by_mtime(tmp_path):
+    write_json(tmp_path, ROWS[:5])
+    packed = PackedRows(FIELDS, [tuple(row.values()) for row in ROWS[:3]])
+    (tmp_path / "requirement.snapshot").write_bytes(encode_binary({"realEstate": packed}))
+    json_path, binary_path = tmp_path / "requirement.json", tmp_path / "requirement.snapshot"
+
+    os.utime(json_path, (1_000_000, 1_000_000))
+    os.utime(binary_path, (2_000_000, 2_000_000))
+    _, table = open_tables(tmp_path, binary=False)
+    assert len(table) == 3
+
+    os.utime(json_path, (3_000_000, 3_000_000))
+    journal, table = open_tables(tmp_path, binary=True)
+    assert len(table) == 5
+    assert journal._loaded_path.endswith(".json")
+
+
+@pytest.mark.parametrize("codec", [None, RowCodec(FIELDS)])
+async def test_dict_table_written_as_binary(tmp_path, codec):
+    write_json(tmp_path, ROWS)
+    journal, table = open_tables(tmp_path, binary=True)
+    await journal.compact()
+    journal._file.close()
+    assert read_binary(str(tmp_path / "requirement.snapshot"))["realEstate"].fields is None
+
+    # Read back by a dict table, and by a compact one that packs the rows on load
+    os.remove(tmp_path / "requirement.json")
+    _, table = open_tables(tmp_path, binary=True, codec=codec)
+    assert table.rows() == ROWS
+    assert type(next(iter(table._rows.values()))) is (dict if codec is None else tuple)
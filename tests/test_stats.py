@@ -0,0 +1,56 @@
+import statistics
+import pytest
+from routes import requirements
+from test_real_estate import listing
+
+pytestmark = pytest.mark.anyio
+
+
+# The aggregates of one location computed from scratch over the whole table
+def brute_force(location: str) -> dict:
+    rows = [row for row in requirements.realEstate if row["location"] == location]
+    with_area = [row["price"] / row["area"] for row in rows if row["area"]]
+    return {
+        "count": len(rows),
+        "meanPrice": statistics.fmean(row["price"] for row in rows) if rows else None,
+        "medianPrice": statistics.median(row["price"] for row in rows) if rows else None,
+        "meanPricePerArea": statistics.fmean(with_area) if with_area else None,
+        "meanMultiplier": statistics.fmean(row["multiplier"] for row in rows) if rows else None,
+    }
+
+
+async def check_location(client, headers, location: str):
+    response = await client.get(f"/stats/locations/{location}", headers=headers)
+    expected = brute_force(location)
+    if not expected["count"]:
+        assert response.status_code == 404 or response.json()["count"] == 0
+        return
+    summary = response.json()
+    for field, value in expected.items():
+        assert summary[field] == pytest.approx(value), field
+
+
+async def test_aggregates_follow_put_update_and_delete(client, admin_headers):
+    locations = ["Statsville", "Otherville"]
+    response = await client.post("/support/realEstate", json=listing(location="Statsville", price=300, area=3),
+                                 headers=admin_headers)
+    first = response.json()["id"]
+    response = await client.post("/support/realEstate", json=listing(location="Statsville", price=100, area=0),
+                                 headers=admin_headers)
+    second = response.json()["id"]
+    for location in locations:
+        await check_location(client, admin_headers, location)
+
+    # Update that moves a listing to another location and changes its price
+    await client.put(f"/support/realEstate/{second}", json=listing(location="Otherville", price=700, multiplier=3.0),
+                     headers=admin_headers)
+    for location in locations:
+        await check_location(client, admin_headers, location)
+
+    await client.delete(f"/support/realEstate/{first}", headers=admin_headers)
+    for location in locations:
+        await check_location(client, admin_headers, location)
+
+    # Including the locations built in bulk at startup
+    for location in {row["location"] for row in requirements.realEstate}:
+        await check_location(client, admin_headers, location)
@@ -0,0 +1,117 @@
+import random
+import pytest
+from services import table as table_module
+from services.compact_rows import RowCodec
+from services.table import SortedIndex, Table
+
+FIELDS = ("id", "location", "type", "price", "area")
+LOCATIONS = ["Bandung", "Jakarta", "Bogor"]
+TYPES = ["Rumah", "Ruko"]
+
+
+def row(rng: random.Random, row_id: int) -> dict:
+    return {"id": row_id, "location": rng.choice(LOCATIONS), "type": rng.choice(TYPES),
+            "price": rng.randint(1, 50) * 1000, "area": rng.randint(20, 200)}
+
+
+# Small chunks, so the index splits, empties and spans many chunks even with a few hundred rows
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(table_module.SortedIndex.__init__, "__defaults__", (4,))
+
+
+@pytest.fixture(params=["dict", "codec"])
+def table_and_rows(request):
+    rng = random.Random(7)
+    rows = {i: row(rng, i) for i in range(1, 301)}
+    table = Table("realEstate", "id", rows.values(), indexes=("location", "type"), sorted_indexes=("price", "area"),
+                  codec=RowCodec(FIELDS) if request.param == "codec" else None)
+    # Live puts, updates and deletes on top of the bulk load
+    for i in range(301, 401):
+        rows[i] = table.put(row(rng, i))
+    for i in rng.sample(sorted(rows), 80):
+        rows[i] = table.put(row(rng, i))
+    for i in rng.sample(sorted(rows), 120):
+        del rows[i]
+        table.delete(i)
+    return table, rows
+
+
+def brute_force(rows: dict, equals: dict, ranges: dict) -> list:
+    def matches(row):
+        if any(row[field] != value for field, value in equals.items()):
+            return False
+        for field, (low, high) in ranges.items():
+            if (low is not None and row[field] < low) or (high is not None and row[field] > high):
+                return False
+        return True
+    return [row for row in rows.values() if matches(row)]
+
+
+CASES = [
+    ({}, {}),
+    ({"location": "Bandung"}, {}),
+    ({"location": "Jakarta", "type": "Ruko"}, {}),
+    ({}, {"price": (10000, 20000)}),
+    ({}, {"price": (None, 5000)}),
+    ({}, {"area": (150, None)}),
+    ({"type": "Rumah"}, {"price": (30000, None), "area": (50, 120)}),
+    ({"location": "Bogor"}, {"price": (60000, None)}),
+]
+
+
+@pytest.mark.parametrize("equals, ranges", CASES)
+@pytest.mark.parametrize("order_by", [None, "price", "area"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_query_matches_brute_force(table_and_rows, equals, ranges, order_by, descending):
+    table, rows = table_and_rows
+    expected = brute_force(rows, equals, ranges)
+    result = list(table.query(equals, ranges, order_by=order_by, descending=descending))
+    assert sorted(result, key=lambda row: row["id"]) == sorted(expected, key=lambda row: row["id"])
+    if order_by is not None:
+        values = [row[order_by] for row in result]
+        assert values == sorted(values, reverse=descending)
+
+
+def test_snapshot_query_matches_plain_query(table_and_rows):
+    table, _ = table_and_rows
+    equals, ranges = {"location": "Bandung"}, {"price": (10000, 40000)}
+    assert list(table.query(equals, ranges, order_by="price", snapshot=True)) == \
+        list(table.query(equals, ranges, order_by="price"))
+
+
+def test_sorted_index_positions_span_chunks():
+    rng = random.Random(3)
+    index = SortedIndex(chunk_size=2)
+    entries = set()
+    for key in range(200):
+        entry = (rng.randint(0, 30), key)
+        entries.add(entry)
+        index.add(*entry)
+    for entry in rng.sample(sorted(entries), 90):
+        entries.discard(entry)
+        index.remove(*entry)
+    index.load([(rng.randint(0, 30), key) for key in range(200, 230)])
+    expected = sorted(entries | {entry for entry in index if entry[1] >= 200})
+    assert list(index) == expected and len(index) == len(expected)
+
+    for low, high in [(None, None), (5, 10), (10, 5), (0, 0), (31, None), (None, -1), (12, 12)]:
+        start, stop = index.bounds(low, high)
+        inside = [key for value, key in expected
+                  if (low is None or value >= low) and (high is None or value <= high)]
+        assert list(index.keys(start, stop)) == inside
+        assert list(index.keys(start, stop, descending=True)) == inside[::-1]
+
+
+def test_insert_many_matches_put(table_and_rows):
+    table, rows = table_and_rows
+    rng = random.Random(11)
+    # New keys, an existing key and a key repeated within the batch
+    batch = [row(rng, i) for i in range(1000, 1040)] + [row(rng, next(iter(rows))), row(rng, 1000)]
+    table.insert_many(batch)
+    for new in batch:
+        rows[new["id"]] = new
+    for equals, ranges in CASES:
+        result = list(table.query(equals, ranges, order_by="price"))
+        assert sorted(result, key=lambda row: row["id"]) == \
+            sorted(brute_force(rows, equals, ranges), key=lambda row: row["id"])
@@ -0,0 +1,77 @@
+# Local stand-in for the friend integration API, for development and benchmarks
+# Jalankan: uvicorn tools.friend_stub:app --port 8001
+# lalu set FRIEND_BASE_URL=http://127.0.0.1:8001 untuk aplikasi utama
+import asyncio
+import os
+from fastapi import FastAPI, Form, Header, HTTPException
+from models.requirements import DataListrik
+from models.users import UserIn
+
+app = FastAPI(title="Friend service stub")
+
+# Artificial upstream latency in seconds, to make pooling and caching visible
+LATENCY = float(os.getenv("FRIEND_STUB_LATENCY", 0.0))
+
+listrik_data = [
+    {"username": f"user{i}", "tanggal": "2023-12-01", "jam": i % 24, "jumlahListrik": float(i)}
+    for i in range(1, int(os.getenv("FRIEND_STUB_LISTRIK_ROWS", 3)) + 1)
+]
+users = {}
+
+
+async def _delay():
+    if LATENCY:
+        await asyncio.sleep(LATENCY)
+
+
+def _check_token(authorization: str):
+    if not authorization or not authorization.startswith("Bearer stub-"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+@app.post("/token/self")
+async def token(username: str = Form(...), password: str = Form(...)):
+    await _delay()
+    return {"access_token": f"stub-{username}", "token_type": "bearer"}
+
+
+@app.post("/register")
+async def register(user: UserIn):
+    await _delay()
+    users[user.username] = user.password
+    return {"username": user.username}
+
+
+@app.get("/umum/data_listrik")
+async def get_data_listrik():
+    await _delay()
+    return listrik_data
+
+
+@app.post("/administrator/data_listik")
+async def add_data_listrik(change: DataListrik, authorization: str = Header(None)):
+    await _delay()
+    _check_token(authorization)
+    listrik_data.append(change.dict())
+    return change
+
+
+@app.put("/administrator/edit_listrik")
+async def edit_data_listrik(change: DataListrik, authorization: str = Header(None)):
+    await _delay()
+    _check_token(authorization)
+    for i, row in enumerate(listrik_data):
+        if row["username"] == change.username:
+            listrik_data[i] = change.dict()
+            return change
+    raise HTTPException(status_code=404, detail="Data listrik not found")
+
+
+@app.delete("/administratordelete_listrik/{username}")
+async def delete_data_listrik(username: str, authorization: str = Header(None)):
+    await _delay()
+    _check_token(authorization)
+    for i, row in enumerate(listrik_data):
+        if row["username"] == username:
+            return listrik_data.pop(i)
+    raise HTTPException(status_code=404, detail="Data listrik not found")